@@ -22,27 +22,104 @@
 
 //  Variables
 int PulseSensorPurplePin = 0;        // Pulse Sensor PURPLE WIRE connected to ANALOG PIN 0
+// Analog pins sampled on every tick, one channel each; add pins to record several sensors
+const byte channelPins[] = {0};           // the PURPLE WIRE pin first
 int LED13 = 13;   //  The on-board Arduion LED
 
 
 int Signal;                // holds the incoming raw data. Signal value can range from 0-1024
 //int Threshold = 550;            // Determine which Signal to "count as a beat", and which to ingore.
 
+// Serial protocol. By default every sample is printed as an ASCII line (works with the Serial Plotter).
+// The PC application sends 'B' to switch to compact binary frames and 'A' to switch back:
+//   0xA5 0x5A | n_channels | seq (uint16 LE) | micros (uint32 LE) | samples (uint16 LE each) | checksum
+// In ASCII mode the channels of a sample are printed comma-separated on one line.
+// checksum = sum of all bytes after the sync bytes, modulo 256.
+const byte NUM_CHANNELS = sizeof(channelPins);
+const byte FRAME_LEN = 9 + 2 * NUM_CHANNELS + 1;
+bool binaryMode = false;
+byte frame[FRAME_LEN];
+
+// Sampling is driven by the Timer1 compare interrupt, so the rate does not depend on how long the
+// serial output takes. The ISR queues (sequence number, timestamp, value); loop() sends them.
+// If the queue overflows the sample is dropped but its sequence number is still consumed, so the
+// PC application can see the gap.
+#define SAMPLE_RATE_HZ 100      // configurable; keep in line with the baud rate for ASCII output
+const byte QUEUE_LEN = 32;
+volatile uint16_t queueSeq[QUEUE_LEN];
+volatile unsigned long queueTime[QUEUE_LEN];
+volatile int queueValue[QUEUE_LEN][NUM_CHANNELS];
+volatile byte queueHead = 0;
+volatile byte queueTail = 0;
+volatile uint16_t seqNo = 0;
+
 
 // The SetUp Function:
 void setup() {
   pinMode(LED13,OUTPUT);         // pin that will blink to your heartbeat!
    Serial.begin(115200);         // Set's up Serial Communication at certain speed.
 
+  noInterrupts();                // Timer1 in CTC mode, prescaler 64, interrupt at SAMPLE_RATE_HZ
+  TCCR1A = 0;
+  TCCR1B = 0;
+  TCNT1 = 0;
+  OCR1A = (F_CPU / 64 / SAMPLE_RATE_HZ) - 1;
+  TCCR1B |= (1 << WGM12);
+  TCCR1B |= (1 << CS11) | (1 << CS10);
+  TIMSK1 |= (1 << OCIE1A);
+  interrupts();
+}
+
+// Timer interrupt: take one sample
+ISR(TIMER1_COMPA_vect) {
+  byte next = (queueHead + 1) % QUEUE_LEN;
+  if (next != queueTail) {
+    queueSeq[queueHead] = seqNo;
+    queueTime[queueHead] = micros();
+    for (byte ch = 0; ch < NUM_CHANNELS; ch++) {
+      queueValue[queueHead][ch] = analogRead(channelPins[ch]);
+    }
+    queueHead = next;
+  }
+  seqNo++;
 }
 
 // The Main Loop Function
 void loop() {
 
-  Signal = analogRead(PulseSensorPurplePin);  // Read the PulseSensor's value.
-                                              // Assign this value to the "Signal" variable.
-
-   Serial.println(Signal);                    // Send the Signal value to Serial Plotter.
+  while (Serial.available() > 0) {             // Protocol selection from the PC application
+    char cmd = Serial.read();
+    if (cmd == 'B') {
+      binaryMode = true;
+    } else if (cmd == 'A') {
+      binaryMode = false;
+    }
+  }
+
+  while (queueTail != queueHead) {             // Send every sample queued by the timer interrupt
+    noInterrupts();
+    uint16_t seq = queueSeq[queueTail];
+    unsigned long timestamp = queueTime[queueTail];
+    int values[NUM_CHANNELS];
+    for (byte ch = 0; ch < NUM_CHANNELS; ch++) {
+      values[ch] = queueValue[queueTail][ch];   // The PulseSensor's values, read in the ISR.
+    }
+    Signal = values[0];
+    queueTail = (queueTail + 1) % QUEUE_LEN;
+    interrupts();
+
+    if (binaryMode) {
+      sendFrame(seq, timestamp, values);
+    } else {
+      for (byte ch = 0; ch < NUM_CHANNELS; ch++) {  // Send the Signal values to Serial Plotter.
+        if (ch > 0) {
+          Serial.print(',');
+        }
+        Serial.print(values[ch]);
+      }
+      Serial.println();
+    }
+  }
 
 //
 //   if(Signal > Threshold){                          // If the signal is above "550", then "turn-on" Arduino's on-Board LED.
@@ -52,7 +129,30 @@ void loop() {
 //   }
 
 
-delay(10); //sampling rate of 100 samples per second
 
+}
 
+// Pack one sample of every channel into a binary frame and send it with a single write
+void sendFrame(uint16_t seq, unsigned long timestamp, const int *values) {
+  frame[0] = 0xA5;
+  frame[1] = 0x5A;
+  frame[2] = NUM_CHANNELS;
+  frame[3] = seq & 0xFF;
+  frame[4] = (seq >> 8) & 0xFF;
+  frame[5] = timestamp & 0xFF;
+  frame[6] = (timestamp >> 8) & 0xFF;
+  frame[7] = (timestamp >> 16) & 0xFF;
+  frame[8] = (timestamp >> 24) & 0xFF;
+  for (byte ch = 0; ch < NUM_CHANNELS; ch++) {
+    frame[9 + 2 * ch] = values[ch] & 0xFF;
+    frame[10 + 2 * ch] = (values[ch] >> 8) & 0xFF;
+  }
+
+  byte checksum = 0;
+  for (byte i = 2; i < FRAME_LEN - 1; i++) {
+    checksum += frame[i];
+  }
+  frame[FRAME_LEN - 1] = checksum;
+
+  Serial.write(frame, FRAME_LEN);
 }
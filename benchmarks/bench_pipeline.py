@@ -0,0 +1,367 @@
+# This Python file uses the following encoding: utf-8
+# End-to-end benchmark of the acquisition pipeline, without an Arduino.
+#
+#   python -m benchmarks.bench_pipeline                        40/100/500/1000 Hz, binary frames
+#   python -m benchmarks.bench_pipeline --rates 100 1000 --protocol ascii --json results.json
+#
+# For every sampling rate two runs are made with the synthetic PPG source of utils/sources.py:
+#   throughput  pre-encoded serial data is pushed through the pipeline as fast as possible
+#               (max samples/s, per-stage timings; peak memory from a second, traced pass)
+#   realtime    the simulator streams at the nominal rate over a pty, a reader thread parses it
+#               with a blockReader and hands blocks to the processing thread through a queue (as
+#               the live view's session queue does); reports the latency from sample generation to
+#               processed block, the maximum queue depth and dropped samples (sequence gaps + pty
+#               overruns)
+# The blocks go through the live view's own code (plots.LiveSignal): 'parse' (serialPort),
+# 'process' (addData: sample rate tracking / resampling, filter, live buffer, signal quality, beat
+# detection, recording), every measure_time seconds 'features' (update_window: quality window,
+# HRV measures, feature store) and once per second 'bars' (FeaturesFigCanvas.draw_bar_plot).
+# The filter and beat detection times inside 'process' come from the pipeline metrics.
+# With --gui (default: auto) the real PPG widget is driven on an offscreen Qt platform; if it
+# cannot be built, a LiveSignal without widget is used and the bar chart is rendered on an Agg
+# figure, and the results are labelled 'headless'. Everything is written to a temporary directory.
+import argparse
+import json
+import os
+import queue
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.devices import serialPort, blockReader
+from utils.hrv_lib import HRV_MEASURES
+from utils.metrics import pipelineMetrics
+from utils.protocol import encode_frames
+from utils.recorder import streamingRecorder
+from utils.session import AcquisitionSession
+from utils.sources import syntheticPPG, ptyDevice
+
+STAGES = ['parse', 'process', 'features', 'bars']
+INNER_STAGES = ['filter', 'beats']     # parts of 'process', from the pipeline metrics
+CONDITIONS = ['Baseline', 'Task', 'Recovery']
+BAR_TIME = 1.0      # seconds between bar chart updates (FeaturesFigCanvas.update_time)
+BLOCK_TIME = 0.01   # seconds of data per serial read in the throughput run
+
+
+class stageTimer():
+    def __init__(self) -> None:
+        self.times = {s: [] for s in STAGES}
+
+    def run(self, stage, fn, *args):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        self.times[stage].append(time.perf_counter() - t0)
+        return out
+
+    def add(self, stage, seconds):
+        self.times[stage].append(seconds)
+        return
+
+    def percentiles(self):
+        # Microseconds per call
+        out = {}
+        for stage, t in self.times.items():
+            if len(t) > 0:
+                p = np.percentile(np.array(t) * 1e6, [50, 95, 99])
+                out[stage] = {'calls': len(t), 'p50_us': p[0], 'p95_us': p[1], 'p99_us': p[2], 'max_us': max(t) * 1e6}
+        return out
+
+
+class statusLabel():
+    # Stands in for the status label of the widget
+    def __init__(self) -> None:
+        self.text = ''
+
+    def setText(self, text):
+        self.text = text
+        return
+
+
+def headless_ui(fs):
+    # The attributes of the widget's ui that LiveSignal uses
+    import types
+    return types.SimpleNamespace(fs=fs, display_fps=30, session=AcquisitionSession(CONDITIONS),
+                                 metrics=pipelineMetrics(), stream=None, label_status=statusLabel(),
+                                 conditions=CONDITIONS, curr_exp_condition=CONDITIONS[0])
+
+
+# The processing chain of the live view for one sampling rate
+class pipeline():
+    def __init__(self, fs, record_dir, gui=None) -> None:
+        import plots
+        self.fs = fs
+        self.port = serialPort()
+        self.recorder = streamingRecorder(os.path.join(record_dir, 'bench_' + str(fs) + '.npy'))
+        self.n_samples = 0
+        self.next_bars = BAR_TIME * fs
+        if gui is not None:
+            # The live plot and bar chart of the real widget
+            self.ui = gui.ui
+            self.signal = gui.myFig
+            self.draw_bars = gui.featFig.draw_bar_plot
+        else:
+            self.ui = headless_ui(fs)
+            self.signal = plots.LiveSignal()
+            self.signal.init_signal(self.ui)
+            self.bar_figure = agg_bar_figure()
+            self.draw_bars = self._draw_bars
+        # Nominal rate as at startup; the rate tracking of addData takes it from there
+        self.signal.set_sample_rate(fs)
+        self.signal.reset_window()
+        self.signal.rate_calibrated = False
+        self.session = self.ui.session
+        self.session.reset_features(self.ui.conditions)
+        self.session.start_acquisition()
+        self.session.start_recording(self.recorder)
+        self.timer = stageTimer()
+
+    def parse(self, data):
+        if self.port.protocol == 'binary':
+            return self.port.decodeBinary(data)
+        return self.port.parseAscii(data), None
+
+    def process(self, data):
+        values, t_us = self.timer.run('parse', self.parse, data)
+        # Read time of the block had it come in real time, for the host-clock rate estimate
+        arrival = (self.n_samples + values.shape[0]) / self.fs
+        return self.process_values(values, t_us, arrival)
+
+    def process_values(self, values, t_us=None, arrival=None):
+        if values.shape[0] == 0:
+            return 0
+        self.timer.run('process', self.signal.addData, values, t_us, arrival)
+        start = time.perf_counter()
+        if self.signal.update_window() is not None:
+            self.timer.add('features', time.perf_counter() - start)
+        self.n_samples += values.shape[0]
+        if self.n_samples >= self.next_bars:
+            self.next_bars += BAR_TIME * self.fs
+            self.timer.run('bars', self.draw_bars)
+        return values.shape[0]
+
+    def inner_stages(self):
+        # Mean / p95 / max of the recent filter and beat detection calls inside 'process'
+        timings = self.ui.metrics.snapshot()['timings']
+        return {name: timings[name] for name in INNER_STAGES if name in timings}
+
+    def close(self):
+        self.session.stop_recording()
+        self.session.stop_acquisition()
+        self.recorder.close()
+        return
+
+    def _draw_bars(self):
+        session = self.session
+        if not session.take_flag(session.features_updated):
+            return
+        fig, bars = self.bar_figure
+        for i, cnd in enumerate(CONDITIONS):
+            if session.features.count(cnd) > 0:
+                medians = session.features.summary(cnd)
+                for m in HRV_MEASURES:
+                    bars[m][i].set_width(medians[m])
+        for ax in fig.axes:
+            ax.relim()
+            ax.autoscale_view()
+        fig.canvas.draw()
+        return
+
+
+def agg_bar_figure():
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=(10, 5), dpi=50)
+    FigureCanvasAgg(fig)
+    bars = {}
+    for k, m in enumerate(HRV_MEASURES):
+        ax = fig.add_subplot(2, 3, k + 1)
+        bars[m] = ax.barh(np.arange(len(CONDITIONS)), np.zeros(len(CONDITIONS)))
+        ax.set_yticks(np.arange(len(CONDITIONS)), labels=CONDITIONS)
+        ax.set_xlabel(m)
+    return fig, bars
+
+
+def make_gui(plot_backend='matplotlib'):
+    # The real widget on an offscreen platform, or None if it cannot be built here
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        from PySide6.QtWidgets import QApplication
+        import main as app_main
+        app = QApplication.instance() or QApplication([])
+        widget = app_main.PPG(plot_backend=plot_backend)
+        return app, widget
+    except Exception as e:
+        print('*** PPG widget unavailable (' + repr(e) + '): results are HEADLESS, without the widget and its bar chart ***')
+        return None, None
+
+
+def encoded_stream(fs, seconds, protocol, seed=0):
+    # Serial bytes of `seconds` of synthetic PPG, split into reads of BLOCK_TIME seconds
+    generator = syntheticPPG(rate=fs, seed=seed)
+    samples, seq, t_us = generator.generate(int(seconds * fs))
+    per_block = max(int(round(fs * BLOCK_TIME)), 1)
+    blocks = []
+    for i in range(0, samples.shape[0], per_block):
+        s = slice(i, i + per_block)
+        if protocol == 'binary':
+            blocks.append(encode_frames(seq[s], t_us[s], samples[s].astype(np.uint16)))
+        else:
+            blocks.append(b''.join(b'%d\r\n' % v for v in samples[s].astype(np.int64).tolist()))
+    return blocks, samples.shape[0]
+
+
+def run_throughput(fs, seconds, protocol, record_dir, gui, trace_memory=False):
+    blocks, n_total = encoded_stream(fs, seconds, protocol)
+    pipe = pipeline(fs, record_dir, gui)
+    pipe.port.protocol = protocol
+    if trace_memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    n = 0
+    for data in blocks:
+        n += pipe.process(data)
+    elapsed = time.perf_counter() - t0
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    pipe.close()
+    return {'samples': n, 'expected': n_total, 'elapsed_s': elapsed, 'samples_per_s': n / elapsed,
+            'realtime_factor': n / elapsed / fs, 'stages': pipe.timer.percentiles(), 'inner_stages': pipe.inner_stages(),
+            'tracked_fs': pipe.ui.fs, 'peak_traced_bytes': peak}
+
+
+def run_realtime(fs, seconds, protocol, record_dir, gui):
+    device = ptyDevice(syntheticPPG(rate=fs, seed=1))
+    pipe = pipeline(fs, record_dir, gui)
+    port = pipe.port
+    port.protocol_preference = protocol
+    port.timeout = 0.2
+    port.connectPort(device.port_name)    # open first: pyserial flushes the input on open
+    device.start()
+    blocks = queue.Queue()
+    max_depth = [0]
+
+    def on_block(values, t_us, arrival):
+        # Acquisition thread, as PPG.push_block: hand the block over
+        blocks.put((values, t_us, arrival))
+        max_depth[0] = max(max_depth[0], blocks.qsize())
+        return
+
+    def consume(timeout):
+        values, t_us, arrival = blocks.get(timeout=timeout)
+        n_before = pipe.n_samples
+        pipe.process_values(values, t_us, arrival)
+        if t_us is not None:
+            generated_at = device.start_time + t_us[-1] * 1e-6
+        else:
+            generated_at = device.start_time + (n_before + values.shape[0]) / fs
+        return time.monotonic() - generated_at
+
+    reader = blockReader(port, on_block)
+    reader.start()
+    reader.resume()
+    latencies = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            latencies.append(consume(0.5))
+        except queue.Empty:
+            pass
+    # Stop the device, then drain what is still in flight so missing samples are real drops
+    device.stop_event.set()
+    device.thread.join()
+    drain_until = time.monotonic() + 1.0
+    while time.monotonic() < drain_until:
+        try:
+            consume(0.1)
+        except queue.Empty:
+            pass
+    reader.close()
+    port.disconnectPort()
+    device.stop()
+    pipe.close()
+
+    generated = device.generator.n_generated
+    out = {'samples': pipe.n_samples, 'generated': generated, 'dropped': generated - pipe.n_samples,
+           'dropped_seq_gaps': port.decoder.dropped_samples, 'bad_frames': port.decoder.bad_frames,
+           'parse_errors': port.parse_errors, 'pty_overruns': device.overruns,
+           'max_queue_depth': max_depth[0], 'protocol': port.protocol, 'stages': pipe.timer.percentiles()}
+    if len(latencies) > 0:
+        p = np.percentile(np.array(latencies) * 1e3, [50, 95, 99])
+        out['latency_ms'] = {'p50': p[0], 'p95': p[1], 'p99': p[2], 'max': max(latencies) * 1e3}
+    return out
+
+
+def print_report(fs, result, label):
+    tp, rt = result['throughput'], result['realtime']
+    print('\n=== ' + str(fs) + ' Hz, ' + label + ' ===')
+    print('throughput  %.0f samples/s (%.0fx real time), peak traced memory %.1f MB'
+          % (tp['samples_per_s'], tp['realtime_factor'], tp['peak_traced_bytes'] / 1e6))
+    if 'latency_ms' in rt:
+        lat = rt['latency_ms']
+        print('realtime    latency p50 %.1f ms, p95 %.1f ms, p99 %.1f ms, max %.1f ms'
+              % (lat['p50'], lat['p95'], lat['p99'], lat['max']))
+    print('            %d/%d samples (%d dropped, %d sequence gaps, %d pty overruns), max queue depth %d, %s'
+          % (rt['samples'], rt['generated'], rt['dropped'], rt['dropped_seq_gaps'], rt['pty_overruns'],
+             rt['max_queue_depth'], rt['protocol']))
+    print('%-10s %8s %10s %10s %10s %10s' % ('stage', 'calls', 'p50 us', 'p95 us', 'p99 us', 'max us'))
+    for stage in STAGES:
+        if stage in tp['stages']:
+            st = tp['stages'][stage]
+            print('%-10s %8d %10.1f %10.1f %10.1f %10.1f'
+                  % (stage, st['calls'], st['p50_us'], st['p95_us'], st['p99_us'], st['max_us']))
+    for stage, st in tp['inner_stages'].items():
+        print('  in process: %s mean %.1f us, p95 %.1f us, max %.1f us (recent calls)'
+              % (stage, st['mean_ms'] * 1e3, st['p95_ms'] * 1e3, st['max_ms'] * 1e3))
+    return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the acquisition pipeline with simulated PPG data.')
+    parser.add_argument('--rates', type=int, nargs='+', default=[40, 100, 500, 1000], help='sampling rates (Hz)')
+    parser.add_argument('--protocol', choices=['binary', 'ascii'], default='binary')
+    parser.add_argument('--signal-seconds', type=float, default=120.0, help='signal length of the throughput run')
+    parser.add_argument('--realtime-seconds', type=float, default=10.0, help='duration of the realtime run')
+    parser.add_argument('--gui', choices=['auto', 'yes', 'no'], default='auto',
+                        help='drive the real widget on an offscreen Qt platform')
+    parser.add_argument('--plot', choices=['matplotlib', 'qt'], default='matplotlib', help='live plot of the widget (as in main.py)')
+    parser.add_argument('--json', default=None, help='write all results to this file')
+    args = parser.parse_args(argv)
+
+    app, widget = (None, None)
+    if args.gui != 'no':
+        app, widget = make_gui(args.plot)
+        if widget is None and args.gui == 'yes':
+            return 1
+    label = 'widget, ' + args.plot + ' plot' if widget is not None else 'headless'
+    results = {'protocol': args.protocol, 'gui': widget is not None, 'pipeline': label, 'rates': {}}
+    with tempfile.TemporaryDirectory() as record_dir:
+        for fs in args.rates:
+            throughput = run_throughput(fs, args.signal_seconds, args.protocol, record_dir, widget)
+            memory = run_throughput(fs, args.signal_seconds, args.protocol, record_dir, widget, trace_memory=True)
+            throughput['peak_traced_bytes'] = memory['peak_traced_bytes']
+            realtime = run_realtime(fs, args.realtime_seconds, args.protocol, record_dir, widget)
+            results['rates'][fs] = {'throughput': throughput, 'realtime': realtime}
+            print_report(fs, results['rates'][fs], label)
+    results['max_rss_kb'] = max_rss_kb()
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+def max_rss_kb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
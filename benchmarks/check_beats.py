@@ -0,0 +1,72 @@
+# This Python file uses the following encoding: utf-8
+# Regression check of the streaming beat detector against heartpy.
+#
+#   python -m benchmarks.check_beats                   50-100 bpm at 100 and 250 Hz
+#   python -m benchmarks.check_beats --hr 45 60 120 --fs 100
+#
+# For every heart rate and sampling rate the synthetic PPG of utils/sources.py is filtered like
+# the live view, fed to streamingBeatDetector in small blocks (as the serial reader delivers it)
+# and passed through runningHRV over the whole recording; heartpy.process analyses the same
+# filtered signal. Exits with 1 if bpm or sdnn of any case differ by more than the tolerances.
+import argparse
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.data_processing_lib import lFilter, PPG_LOWCUT, PPG_HIGHCUT, PPG_FILTER_ORDER
+from utils.hrv_lib import streamingBeatDetector, runningHRV
+from utils.sources import syntheticPPG
+
+SETTLE_TIME = 5.0   # seconds left out at the start, while the filter and detector settle
+BLOCK_TIME = 0.05   # seconds of data per detector call
+
+
+def detector_measures(filtered, fs):
+    detector = streamingBeatDetector(fs)
+    hrv = runningHRV(window=None)
+    n_block = max(1, int(round(BLOCK_TIME * fs)))
+    for start in range(0, filtered.shape[0], n_block):
+        times, ibis = detector.process(filtered[start:start + n_block])
+        keep = times >= SETTLE_TIME
+        hrv.add(times[keep], ibis[keep])
+    return hrv.measures()
+
+
+def heartpy_measures(filtered, fs):
+    import heartpy as hp
+    wd, m = hp.process(filtered[int(SETTLE_TIME * fs):], sample_rate=fs)
+    return m
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the streaming beat detector with heartpy on synthetic PPG.')
+    parser.add_argument('--hr', type=float, nargs='+', default=[50, 55, 60, 66, 72, 80, 90, 100], help='heart rates (bpm)')
+    parser.add_argument('--fs', type=int, nargs='+', default=[100, 250], help='sampling rates (Hz)')
+    parser.add_argument('--seconds', type=float, default=120.0, help='signal length per case')
+    parser.add_argument('--bpm-tolerance', type=float, default=1.0, help='allowed bpm difference')
+    parser.add_argument('--sdnn-tolerance', type=float, default=0.15, help='allowed relative sdnn difference')
+    args = parser.parse_args(argv)
+
+    failed = 0
+    print('   fs     hr   detector bpm / sdnn    heartpy bpm / sdnn')
+    for fs in args.fs:
+        for hr in args.hr:
+            x, seq, t_us = syntheticPPG(rate=fs, hr=hr, seed=1).generate(int(args.seconds * fs))
+            filtered = lFilter(PPG_LOWCUT, PPG_HIGHCUT, fs, order=PPG_FILTER_ORDER).process_block(x)
+            ours = detector_measures(filtered, fs)
+            ref = heartpy_measures(filtered, fs)
+            ok = (abs(ours['bpm'] - ref['bpm']) <= args.bpm_tolerance and
+                  abs(ours['sdnn'] - ref['sdnn']) <= args.sdnn_tolerance * ref['sdnn'])
+            failed += not ok
+            print('%5d %6.1f   %6.1f / %6.1f ms     %6.1f / %6.1f ms   %s' %
+                  (fs, hr, ours['bpm'], ours['sdnn'], ref['bpm'], ref['sdnn'], 'ok' if ok else 'FAIL'))
+    if failed > 0:
+        print(str(failed) + ' case(s) outside the tolerances')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
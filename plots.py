@@ -0,0 +1,606 @@
+# This Python file uses the following encoding: utf-8
+# Plots of the main window: the live PPG signal (matplotlib or Qt-native) with the signal
+# processing behind it, and the bar chart of the features per condition.
+# Imported by PPG.build_figures once the window is on screen, so matplotlib and scipy do not
+# delay startup.
+import time
+import numpy as np
+
+from PySide6.QtWidgets import QWidget
+from PySide6.QtCore import Signal, QTimer, QPointF, Qt
+from PySide6.QtGui import QPainter, QPen, QColor, QPolygonF
+
+# import matplotlib
+# matplotlib.use('TkAgg')
+# from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg as FigureCanvas
+from matplotlib import colormaps
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.lines import Line2D
+from matplotlib.animation import TimedAnimation
+from matplotlib.figure import Figure
+
+from utils.data_processing_lib import lFilter, PPG_LOWCUT, PPG_HIGHCUT, PPG_FILTER_ORDER
+from utils.buffers import ringBuffer
+from utils.timing import sampleRateEstimator, streamResampler, frameScheduler
+from utils.hrv_lib import streamingBeatDetector, runningHRV
+from utils.quality import signalQuality
+from utils.workers import SKIP
+from utils.plotting import minmax_decimate
+
+# Signal processing behind the live plot, shared by the matplotlib and the Qt-native widget:
+# filtering, live window, beat / HRV tracking, sample rate tracking and recording
+class LiveSignal():
+    def init_signal(self, uiObj):
+        self.uiObj = uiObj
+        # The data
+        self.max_time = 20
+        self.measure_time = 5
+        self.xlim = self.max_time*self.uiObj.fs
+        self.n = np.linspace(0, self.max_time, self.xlim)
+        # Filtered samples are written straight into a preallocated ring buffer; self.y is a zero-copy
+        # view of its latest window, refreshed on every frame
+        self.ring = ringBuffer(self.xlim)
+        self.last_count = 0
+        self.y = self.ring.view()
+
+        self.lowcut = PPG_LOWCUT
+        self.highcut = PPG_HIGHCUT
+        self.filt_order = PPG_FILTER_ORDER
+        self.filtObj = lFilter(self.lowcut, self.highcut, self.uiObj.fs, order=self.filt_order)
+        self.count_frame = 0# self.max_time * self.uiObj.fs
+        # Beats are detected as filtered samples arrive; HRV measures cover the beats of the last max_time seconds
+        self.beat_detector = streamingBeatDetector(self.uiObj.fs)
+        self.hrv = runningHRV(window=self.max_time)
+        # Beats wait for the quality check of their measure window before they enter the HRV measures
+        self.quality = signalQuality()
+        self.window_beats = []
+        self.signal_usable = True
+
+        # Sampling rate tracking: the first settled estimate replaces the nominal fs; later drift
+        # beyond the threshold is absorbed by resampling onto the fs grid
+        self.drift_threshold = 0.02
+        self.rate_estimator = sampleRateEstimator()
+        self.rate_calibrated = False
+        self.resampler = None
+        self.block_t_end = 0.0     # without device timestamps: time after the last resampled block
+        self.display_channel = 0
+        self.unix_offset = time.time() - time.monotonic()  # arrival times (monotonic) -> Unix time of the live stream
+        # Redraws at a fixed display rate; the samples that arrived in between are processed at
+        # once on every tick
+        self.scheduler = frameScheduler(self.uiObj.display_fps)
+        return
+
+    def set_sample_rate(self, fs):
+        # Rebuilds everything that depends on fs: filter design, plot timebase and window buffer
+        self.uiObj.fs = fs
+        self.xlim = self.max_time*self.uiObj.fs
+        self.n = np.linspace(0, self.max_time, self.xlim)
+        self.ring = ringBuffer(self.xlim)
+        self.last_count = 0
+        self.count_frame = 0
+        self.y = self.ring.view()
+        self.filtObj = lFilter(self.lowcut, self.highcut, self.uiObj.fs, order=self.filt_order)
+        self.beat_detector = streamingBeatDetector(self.uiObj.fs)
+        self.hrv.reset()
+        self.quality.reset()
+        self.window_beats = []
+        self.resampler = None
+        return
+
+    def track_sample_rate(self, values, t_us, arrival=None):
+        # arrival: when the block was read; without device timestamps the estimate rests on it, so
+        # the time the block waited for the next display tick must not be part of it
+        arrival = time.monotonic() if arrival is None else arrival
+        fs_est = self.rate_estimator.update(values.shape[0], t_us, arrival)
+        if not self.rate_estimator.settled:
+            return values
+        drift = abs(fs_est - self.uiObj.fs) / self.uiObj.fs
+        if not self.rate_calibrated:
+            self.rate_calibrated = True
+            if drift > self.drift_threshold:
+                self.set_sample_rate(int(round(fs_est)))
+                self.uiObj.label_status.setText("Measured sampling rate: " + str(round(fs_est, 1)) + " Hz")
+            return values
+
+        if self.resampler is None and drift > self.drift_threshold:
+            self.resampler = streamResampler(self.uiObj.fs)
+            self.block_t_end = 0.0
+        elif self.resampler is not None and drift < self.drift_threshold / 2:
+            self.resampler = None
+        if self.resampler is None:
+            return values
+
+        if t_us is not None:
+            t = t_us * 1e-6
+        else:
+            # No device clock: space the block evenly at the measured rate, after the previous one
+            t = self.block_t_end + np.arange(values.shape[0]) / fs_est
+            self.block_t_end += values.shape[0] / fs_est
+        return self.resampler.process(values, t)
+
+    def reset_window(self, fill=0.0):
+        self.ring.reset(fill)
+        # The rate is measured again, as after init_signal
+        self.rate_estimator.reset()
+        self.rate_calibrated = False
+        self.resampler = None
+        self.beat_detector.reset()
+        self.hrv.reset()
+        self.quality.reset()
+        self.window_beats = []
+        self.last_count = 0
+        self.count_frame = 0
+        self.y = self.ring.view()
+        return
+
+    def addData(self, value, t_us=None, arrival=None):
+        # value can be a single sample or a block of samples; the filter state is carried across calls.
+        # arrival: time.monotonic() at which the last sample was read (see blockReader)
+        arrival = time.monotonic() if arrival is None else arrival
+        values = np.atleast_1d(np.asarray(value, dtype=np.float64))
+        values = self.track_sample_rate(values, t_us, arrival)
+        # Boards with several channels: all of them are recorded, the live view follows one
+        display_values = values[:, self.display_channel] if values.ndim > 1 else values
+        t0 = time.perf_counter()
+        filtered_values = self.filtObj.process_block(display_values)
+        self.ring.write(filtered_values)
+        self.quality.process(display_values, filtered_values)
+        t1 = time.perf_counter()
+        beat_times, ibis = self.beat_detector.process(filtered_values)
+        if ibis.shape[0] > 0:
+            self.window_beats.append((beat_times, ibis))
+        t2 = time.perf_counter()
+        self.uiObj.session.record(values)
+        metrics = self.uiObj.metrics
+        metrics.observe('filter', t1 - t0)
+        metrics.observe('beats', t2 - t1)
+        metrics.count('samples_processed', values.shape[0])
+        stream = self.uiObj.stream
+        if stream is not None and filtered_values.shape[0] > 0:
+            t_last = self.unix_offset + arrival
+            stream.publish_samples(t_last - (filtered_values.shape[0] - 1) / self.uiObj.fs, 1.0 / self.uiObj.fs, filtered_values)
+        return
+
+    def process_pending(self):
+        # Blocks read since the last tick, merged into one block for a single vectorized pass
+        blocks = self.uiObj.session.take_blocks()
+        if len(blocks) == 0:
+            return
+        values = [b[0] for b in blocks]
+        t_us = [b[1] for b in blocks]
+        arrivals = [b[2] for b in blocks]
+        if len(blocks) > 1 and len(set(v.shape[1:] for v in values)) == 1 and \
+                (all(t is None for t in t_us) or all(t is not None for t in t_us)):
+            values = [np.concatenate(values)]
+            t_us = [None if t_us[0] is None else np.concatenate(t_us)]
+            arrivals = arrivals[-1:]
+        for v, t, arrival in zip(values, t_us, arrivals):
+            self.addData(v, t, arrival)
+        return
+
+    def update_window(self):
+        # Takes the samples written since the last frame; every measure_time seconds returns new y
+        # limits from the latest measure window (and stores features while recording), else None
+        count = self.ring.count
+        self.count_frame += count - self.last_count
+        self.last_count = count
+        self.y = self.ring.view(count=count)
+        if self.count_frame < (self.measure_time * self.uiObj.fs):
+            return None
+        self.count_frame = 0
+        measure_window = self.y[-self.measure_time*self.uiObj.fs:]
+        start = time.perf_counter()
+        if self.check_quality():
+            if self.uiObj.session.recording.is_set():
+                self.compute_ppg_features()
+            if self.uiObj.stream is not None:
+                self.stream_features()
+        self.uiObj.metrics.observe('features', time.perf_counter() - start)
+        return np.min(measure_window), np.max(measure_window)
+
+    def check_quality(self):
+        # Closes the quality window: the beats of a usable window go into the HRV measures, those of
+        # an unusable one are dropped. Returns whether the window was usable.
+        q = self.quality.close_window()
+        usable = q is not None and q['usable']
+        if usable:
+            for beat_times, ibis in self.window_beats:
+                self.hrv.add(beat_times, ibis)
+        else:
+            self.hrv.gap()
+            self.uiObj.metrics.count('windows_rejected')
+        self.window_beats = []
+        if usable != self.signal_usable:
+            self.signal_usable = usable
+            if usable:
+                self.uiObj.label_status.setText("Signal quality OK")
+            elif q is not None:
+                messages = {'clipped': "sensor saturated", 'flat': "no signal, check the sensor", 'noisy': "too much noise or motion"}
+                self.uiObj.label_status.setText("Signal quality: " + messages[q['reason']] + ", features paused")
+        return usable
+
+    def compute_ppg_features(self):
+        # The measures are kept up to date beat by beat, so this is only a lookup
+        m = self.hrv.measures()
+        if m is None:
+            return
+        # for key, measure in m.items():
+        #     print(key, measure)
+
+        self.uiObj.session.add_features(self.uiObj.curr_exp_condition, m, time.time())
+
+    def stream_features(self):
+        # Subscribers of the live stream get the measures of every usable window, recording or not
+        m = self.hrv.measures()
+        if m is not None:
+            self.uiObj.stream.publish_features(time.time(), self.uiObj.curr_exp_condition, m)
+        return
+
+
+class LivePlotFigCanvas(FigureCanvas, TimedAnimation, LiveSignal):
+    def __init__(self, uiObj):
+        self.init_signal(uiObj)
+        # print(matplotlib.__version__)
+        # The window
+        self.fig = Figure(figsize=(25,5), dpi=50)
+        self.ax1 = self.fig.add_subplot(111)
+        # self.ax1 settings
+        self.ax1.set_xlabel('Time (seconds)', fontsize=18)
+        self.ax1.set_ylabel('PPG Signal', fontsize=18)
+        self.line1 = Line2D([], [], color='blue')
+        self.line1_tail = Line2D([], [], color='red', linewidth=2)
+        self.line1_head = Line2D([], [], color='red', marker='o', markeredgecolor='r')
+        self.ax1.add_line(self.line1)
+        self.ax1.add_line(self.line1_tail)
+        self.ax1.add_line(self.line1_head)
+        self.ax1.set_xlim(0, self.max_time)
+        self.ax1.set_ylim(-100, 200)
+
+        # Hide the right and top spines
+        self.ax1.spines['right'].set_visible(False)
+        self.ax1.spines['top'].set_visible(False)
+
+        # Only show ticks on the left and bottom spines
+        self.ax1.yaxis.set_ticks_position('left')
+        self.ax1.xaxis.set_ticks_position('bottom')
+
+        FigureCanvas.__init__(self, self.fig)
+        TimedAnimation.__init__(self, self.fig, interval=int(round(1000.0/self.scheduler.fps)), blit = True)
+        return
+
+    def new_frame_seq(self):
+        return iter(range(self.n.size))
+
+    def _init_draw(self):
+        lines = [self.line1, self.line1_tail, self.line1_head]
+        for l in lines:
+            l.set_data([], [])
+        return
+
+    def _step(self, *args):
+        # Extends the _step() method for the TimedAnimation class: new samples are processed on
+        # every tick, a frame is drawn only when the scheduler allows it.
+        start = time.monotonic()
+        self.process_pending()
+        if not self.scheduler.should_render(start):
+            return
+        try:
+            TimedAnimation._step(self, *args)
+        except Exception as e:
+            self.uiObj.metrics.count('render_errors')
+            TimedAnimation._stop(self)
+            pass
+        end = time.monotonic()
+        self.scheduler.rendered(start, end)
+        self.uiObj.metrics.observe('render', end - start)
+        return
+
+    def _draw_frame(self, framedata):
+        if self.uiObj.session.acquiring.is_set():
+            margin = 2
+            ylim = self.update_window()
+            if ylim is not None:
+                self.ax1.set_ylim(*ylim)
+            self.line1.set_data(self.n[ 0 : self.n.size - margin ], self.y[ 0 : self.n.size - margin ])
+            # Last samples before the head, as views (no per-frame np.append)
+            self.line1_tail.set_data(self.n[-10:-margin], self.y[-10:-margin])
+            self.line1_head.set_data(self.n[-1 - margin:-margin], self.y[-1 - margin:-margin])
+            self._drawn_artists = [self.line1, self.line1_tail, self.line1_head]
+        return
+
+
+# Qt-native alternative to LivePlotFigCanvas (python main.py --plot qt). The live window is reduced
+# to a min/max pair per pixel column and drawn as one QPainter polyline, so a frame costs the same
+# whatever the sampling rate and no matplotlib rendering is involved.
+class QtLivePlot(QWidget, LiveSignal):
+    def __init__(self, uiObj):
+        QWidget.__init__(self)
+        self.init_signal(uiObj)
+        self.setFixedSize(1250, 250)    # same as the matplotlib canvas (25 x 5 inches at 50 dpi)
+        self.plot_margins = (60, 10, 15, 35)    # left, top, right, bottom (pixels)
+        self.ylim = (-100.0, 200.0)
+        self.paint_requested = None     # time of the tick that asked for the pending repaint
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.update_frame)
+        self.timer.start(int(round(1000.0/self.scheduler.fps)))
+        return
+
+    def update_frame(self):
+        now = time.monotonic()
+        self.process_pending()
+        if self.uiObj.session.acquiring.is_set() and self.scheduler.should_render(now):
+            ylim = self.update_window()
+            if ylim is not None and ylim[1] > ylim[0]:
+                self.ylim = ylim
+            self.paint_requested = now
+            self.update()
+        return
+
+    def paintEvent(self, event):
+        self.paint_frame()
+        if self.paint_requested is not None:
+            end = time.monotonic()
+            self.scheduler.rendered(self.paint_requested, end)
+            self.uiObj.metrics.observe('render', end - self.paint_requested)
+            self.paint_requested = None
+        return
+
+    def paint_frame(self):
+        left, top, right, bottom = self.plot_margins
+        w = self.width() - left - right
+        h = self.height() - top - bottom
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.white)
+
+        # Axes with a tick every measure_time seconds
+        painter.setPen(QPen(Qt.black, 1))
+        painter.drawLine(left, top, left, top + h)
+        painter.drawLine(left, top + h, left + w, top + h)
+        for sec in range(0, self.max_time + 1, self.measure_time):
+            x = left + int(round(w * sec / self.max_time))
+            painter.drawLine(x, top + h, x, top + h + 5)
+            painter.drawText(x - 10, top + h + 20, str(sec))
+        painter.drawText(left + w // 2 - 50, top + h + 33, 'Time (seconds)')
+        lo, hi = self.ylim
+        painter.drawText(5, top + 10, '%.0f' % hi)
+        painter.drawText(5, top + h, '%.0f' % lo)
+
+        margin = 2
+        y = self.y[:self.y.shape[0] - margin]
+        if y.shape[0] < 2:
+            return
+        scale = h / (hi - lo)
+        painter.setClipRect(left, top, w, h)
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        xs, ys = minmax_decimate(y, w)
+        painter.setPen(QPen(QColor('blue'), 1))
+        painter.drawPolyline(self.polygon(left + xs, top + h - (ys - lo) * scale))
+
+        # Red tail over the last samples and a marker at the newest one
+        tail = np.arange(y.shape[0] - 8, y.shape[0])
+        tail_x = left + tail * ((w - 1) / (y.shape[0] - 1))
+        tail_y = top + h - (y[tail] - lo) * scale
+        painter.setPen(QPen(QColor('red'), 2))
+        painter.drawPolyline(self.polygon(tail_x, tail_y))
+        painter.setBrush(QColor('red'))
+        painter.drawEllipse(QPointF(tail_x[-1], tail_y[-1]), 4, 4)
+        painter.end()
+        return
+
+    @staticmethod
+    def polygon(x, y):
+        return QPolygonF([QPointF(a, b) for a, b in zip(x.tolist(), y.tolist())])
+
+    def reset_window(self, fill=0.0):
+        LiveSignal.reset_window(self, fill)
+        self.update()
+        return
+
+
+# The six bar axes for one set of conditions
+class BarLayout():
+    def __init__(self, fig, conditions, bar_axes) -> None:
+        self.key = tuple(conditions)
+        y_pos = np.arange(len(conditions))
+        fontsize = 16 if len(conditions) <= 6 else max(8, 96 // len(conditions))
+        colors = colormaps['nipy_spectral'](np.linspace(0.15, 0.85, len(conditions)))
+        self.axes = {}
+        self.bars = {}
+        self.values = {}
+        self.limits = {}
+        for m, pos, label in bar_axes:
+            # A label of its own, as matplotlib < 3.6 returns the existing axes for the same position
+            ax = fig.add_subplot(pos, label=m + ' ' + repr(self.key))
+            self.values[m] = np.zeros(len(conditions))
+            self.limits[m] = (0, 0.1)
+            bars = ax.barh(y_pos, self.values[m], color=colors)
+            for bar in bars:
+                bar.set_animated(True)  # drawn by blitting only
+            ax.set_yticks(y_pos, labels=conditions, fontsize=fontsize)
+            ax.set_xlabel(label, fontsize=16)
+            ax.invert_xaxis()
+            ax.invert_yaxis()
+            # Hide the right and top spines
+            ax.spines['right'].set_visible(False)
+            ax.spines['top'].set_visible(False)
+            # Only show ticks on the left and bottom spines
+            ax.yaxis.set_ticks_position('left')
+            ax.xaxis.set_ticks_position('bottom')
+            ax.set_xlim(*self.limits[m])
+            self.axes[m] = ax
+            self.bars[m] = bars
+        return
+
+    def set_visible(self, visible):
+        for ax in self.axes.values():
+            ax.set_visible(visible)
+        return
+
+    def clear(self):
+        for m, ax in self.axes.items():
+            self.values[m][:] = 0
+            for bar in self.bars[m]:
+                bar.set_width(0)
+            self.limits[m] = (0, 0.1)
+            ax.set_xlim(*self.limits[m])
+        return
+
+
+# Median features per condition as horizontal bars, one axes per measure. Summaries are prepared on
+# a worker thread, only for conditions that got new features, and handed to the Qt thread through a
+# queued signal; the Qt thread only touches the bars whose value changed. Bars are animated artists
+# blitted over a cached background, so a plain value change redraws just the affected axes; the
+# whole figure (ticks, labels) is redrawn only when an axis limit changes or the experiment is reset.
+# Each set of conditions gets its own axes (BarLayout), kept hidden while another experiment is shown.
+class FeaturesFigCanvas(FigureCanvas):
+    summary_ready = Signal(object)
+
+    # (measure, subplot, axis label) in the order of the layout
+    BAR_AXES = [('bpm', 231, 'Pulse Rate'), ('sdnn', 232, 'SDNN'), ('sdsd', 233, 'SDSD'),
+                ('pnn50', 234, 'pNN50'), ('rmssd', 235, 'RMSSD'), ('ibi', 236, 'IBI')]
+
+    def __init__(self, uiObj):
+        self.uiObj = uiObj
+        # print(matplotlib.__version__)
+
+        self.update_time = 1000   #milli-seconds
+        self.summary_counts = {}    # condition -> feature count of the last summary (worker side)
+
+        # The window
+        self.fig = Figure(figsize=(10, 5), dpi=50)
+        # Bars and axes per condition set, built on first use and kept, so switching between
+        # experiments only toggles visibility
+        self.layouts = {}
+        self.layout = None
+        conditions = [self.uiObj.listWidget_expConditions.item(x).text() for x in range(self.uiObj.listWidget_expConditions.count())]
+        self.show_conditions(conditions)
+
+        FigureCanvas.__init__(self, self.fig)
+        self.backgrounds = {}
+        self.mpl_connect('draw_event', self.on_draw)
+        self.summary_ready.connect(self.apply_summary)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.request_summary)
+        self.timer.start(self.update_time)
+        return
+
+    def show_conditions(self, conditions):
+        # Switches to the axes of this condition set (building them the first time) with empty bars
+        key = tuple(conditions)
+        if self.layout is not None and self.layout.key == key:
+            return
+        if self.layout is not None:
+            self.layout.set_visible(False)
+        if key not in self.layouts:
+            self.layouts[key] = BarLayout(self.fig, conditions, self.BAR_AXES)
+        self.layout = self.layouts[key]
+        self.layout.set_visible(True)
+        # The subplot margins are shared by all layouts; fit them to the labels shown
+        # self.fig.set_title('Physiological parameters under different experimental conditions')
+        self.fig.tight_layout()
+        self.conditions = list(conditions)
+        self.axes = self.layout.axes
+        self.bars = self.layout.bars
+        self.values = self.layout.values    # drawn widths
+        self.limits = self.layout.limits
+        self.backgrounds = {}
+        return
+
+    def request_summary(self):
+        # Skipped if the previous summary is still being prepared, so updates never pile up
+        self.uiObj.workers.submit(self.prepare_and_send, key='bar_plot', policy=SKIP)
+        return
+
+    def prepare_and_send(self):
+        start = time.perf_counter()
+        summary = self.prepare_summary()
+        self.uiObj.metrics.observe('bar_summary', time.perf_counter() - start)
+        if summary is not None:
+            self.summary_ready.emit(summary)
+        return
+
+    def prepare_summary(self):
+        # Worker side: medians of the conditions with new features since the last summary, or a
+        # reset, or None if nothing changed
+        session = self.uiObj.session
+
+        # A reset (experiment changed) takes precedence; pending updates are then drawn on the next tick.
+        # The store is read after the flag, so a reset in between cannot pair it with the old store
+        reset = session.take_flag(session.features_reset)
+        if not reset and not session.take_flag(session.features_updated):
+            return None
+        with session.lock:
+            features_dict = session.features
+        if reset:
+            self.summary_counts = {}
+            return {'reset': True, 'conditions': features_dict.conditions()}
+        medians = {}
+        for cnd in features_dict.conditions():
+            count = features_dict.count(cnd)
+            if count > 0 and count != self.summary_counts.get(cnd):
+                medians[cnd] = features_dict.summary(cnd)    # maintained incrementally by the store
+                self.summary_counts[cnd] = count
+        return {'reset': False, 'medians': medians}
+
+    def apply_summary(self, summary):
+        start = time.perf_counter()
+        self.update_bars(summary)
+        self.uiObj.metrics.observe('bar_draw', time.perf_counter() - start)
+        return
+
+    def update_bars(self, summary):
+        # Qt thread: update the changed bars; redraw everything only if a limit changed
+        if summary['reset']:
+            self.show_conditions(summary['conditions'])
+            self.layout.clear()
+            self.draw_idle()
+            return
+
+        changed = set()
+        relayout = False
+        for cnd, medians in summary['medians'].items():
+            if cnd not in self.conditions:
+                continue
+            i = self.conditions.index(cnd)
+            for m in self.axes:
+                v = medians[m]
+                if np.isnan(v) or v == self.values[m][i]:
+                    continue
+                self.values[m][i] = v
+                self.bars[m][i].set_width(v)
+                changed.add(m)
+                lo, hi = self.limits[m]
+                if v < lo or v > hi:
+                    self.limits[m] = (min(lo, v), max(hi, v))
+                    self.axes[m].set_xlim(*self.limits[m])
+                    relayout = True
+        if relayout or len(self.backgrounds) == 0:
+            self.draw_idle()
+        else:
+            for m in changed:
+                self.blit_axes(m)
+        return
+
+    def draw_bar_plot(self):
+        # Prepare and apply in one go on the calling thread (used by the benchmark)
+        summary = self.prepare_summary()
+        if summary is not None:
+            self.apply_summary(summary)
+        return
+
+    def on_draw(self, event):
+        # After a full redraw (which skips the animated bars): cache the backgrounds, add the bars
+        self.backgrounds = {m: self.copy_from_bbox(ax.bbox) for m, ax in self.axes.items()}
+        for m, ax in self.axes.items():
+            for bar in self.bars[m]:
+                ax.draw_artist(bar)
+        return
+
+    def blit_axes(self, m):
+        ax = self.axes[m]
+        self.restore_region(self.backgrounds[m])
+        for bar in self.bars[m]:
+            ax.draw_artist(bar)
+        self.blit(ax.bbox)
+        return
@@ -0,0 +1,168 @@
+# This Python file uses the following encoding: utf-8
+# Headless batch processing of saved recordings, without Qt or a serial port.
+#
+#   python process_recordings.py data/ --jobs 8
+#
+# Finds session directories (index.json, see utils/session_format.py) and legacy
+# <experiment>_<condition>_raw_signal_<utc>.npy files below the given directories, filters every
+# recording with the same lFilter settings as the live view, computes the HRV features per window
+# and channel on the windows whose signal quality is usable (utils/quality.py), and writes windows.csv (one row per window) and summary.csv (median per experiment /
+# condition / channel).
+# Recordings are processed in parallel with a process pool.
+import argparse
+import csv
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from utils.data_processing_lib import lFilter, PPG_LOWCUT, PPG_HIGHCUT, PPG_FILTER_ORDER
+from utils.hrv_lib import HRV_MEASURES, sliding_window_features, streaming_window_features
+from utils.multichannel import hold_missing
+from utils.quality import signalQuality
+from utils.session_format import sessionReader, INDEX_FILE, RAW_FILE
+
+
+def find_recordings(roots, default_fs):
+    # One task per recording: dict(label, experiment, condition, path, start, stop, fs)
+    tasks = []
+    for root in roots:
+        for index_path in sorted(glob.glob(os.path.join(root, '**', INDEX_FILE), recursive=True)):
+            session_path = os.path.dirname(index_path)
+            session = sessionReader(session_path)
+            for i, seg in enumerate(session.segments):
+                tasks.append({'label': os.path.basename(session_path) + '#' + str(i),
+                              'experiment': session.index['experiment'], 'condition': seg['condition'],
+                              'path': os.path.join(session_path, RAW_FILE), 'start': seg['start'], 'stop': seg['stop'],
+                              'fs': seg['fs']})
+
+        for path in sorted(glob.glob(os.path.join(root, '**', '*_raw_signal_*.npy'), recursive=True)):
+            prefix = os.path.basename(path)[:-len('.npy')].rsplit('_raw_signal_', 1)[0]
+            experiment, _, condition = prefix.partition('_')
+            fs = default_fs
+            sidecar = os.path.splitext(path)[0] + '.json'
+            if os.path.exists(sidecar):
+                with open(sidecar) as f:
+                    info = json.load(f)
+                experiment = info.get('experiment', experiment)
+                condition = info.get('condition', condition)
+                fs = info.get('fs', fs)
+            tasks.append({'label': os.path.basename(path), 'experiment': experiment, 'condition': condition,
+                          'path': path, 'start': 0, 'stop': None, 'fs': fs})
+    return tasks
+
+
+def process_recording(task, engine='vectorized', window=20.0, step=5.0):
+    # Returns the per-window rows of one recording, for every channel
+    raw = np.load(task['path'], mmap_mode='r')[task['start']:task['stop']]
+    if raw.ndim == 1:
+        raw = raw[:, np.newaxis]
+    if np.isnan(raw).any():
+        # group recordings hold NaN where a board stopped delivering
+        raw = hold_missing(raw)[0]
+    fs = task['fs']
+    # Same causal filter as the live view, so offline and live features agree; all channels at once
+    filtered = lFilter(PPG_LOWCUT, PPG_HIGHCUT, fs, order=PPG_FILTER_ORDER).process_block(raw)
+
+    rows = []
+    for ch in range(filtered.shape[1]):
+        if engine == 'heartpy':
+            ends, measures = heartpy_window_features(filtered[:, ch], fs, window, step, raw[:, ch])
+        elif engine == 'streaming':
+            ends, measures = streaming_window_features(filtered[:, ch], fs, window, step, raw[:, ch], signalQuality())
+        else:
+            ends, measures = sliding_window_features(filtered[:, ch], fs, window, step, raw[:, ch], signalQuality())
+        for i in range(ends.shape[0]):
+            row = {'recording': task['label'], 'experiment': task['experiment'], 'condition': task['condition'],
+                   'channel': ch, 'window_end': ends[i]}
+            for m in HRV_MEASURES:
+                row[m] = measures[m][i]
+            rows.append(row)
+    return rows
+
+
+def heartpy_window_features(filtered, fs, window, step, raw):
+    # Former per-window heartpy analysis; windows of unusable quality are not analysed and windows
+    # heartpy rejects are skipped
+    import heartpy as hp
+    n_window = int(round(window * fs))
+    n_step = int(round(step * fs))
+    quality = signalQuality()
+    ends = []
+    measures = {m: [] for m in HRV_MEASURES}
+    for end in range(n_window, filtered.shape[0] + 1, n_step):
+        if not quality.assess(raw[end - n_window:end], filtered[end - n_window:end])['usable']:
+            continue
+        try:
+            wd, m = hp.process(filtered[end - n_window:end], sample_rate=fs)
+        except Exception:
+            continue
+        ends.append(end / fs)
+        for k in HRV_MEASURES:
+            measures[k].append(m[k])
+    return np.array(ends), {k: np.array(v) for k, v in measures.items()}
+
+
+def summarize(rows):
+    # Median of every measure per (experiment, condition, channel)
+    groups = {}
+    for row in rows:
+        groups.setdefault((row['experiment'], row['condition'], row['channel']), []).append(row)
+    summary = []
+    for (experiment, condition, channel), group in sorted(groups.items()):
+        out = {'experiment': experiment, 'condition': condition, 'channel': channel,
+               'n_recordings': len(set(r['recording'] for r in group)), 'n_windows': len(group)}
+        for m in HRV_MEASURES:
+            out[m] = float(np.nanmedian([r[m] for r in group]))
+        summary.append(out)
+    return summary
+
+
+def write_csv(path, rows, fieldnames):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compute HRV features for saved PPG recordings.')
+    parser.add_argument('inputs', nargs='+', help='directories with session folders or *_raw_signal_*.npy files')
+    parser.add_argument('--out-dir', default=None, help='where to write windows.csv and summary.csv (default: first input)')
+    parser.add_argument('--fs', type=float, default=100, help='sampling rate of recordings without metadata (Hz)')
+    parser.add_argument('--window', type=float, default=20.0, help='feature window length (s)')
+    parser.add_argument('--step', type=float, default=5.0, help='feature window step (s)')
+    parser.add_argument('--engine', choices=['vectorized', 'streaming', 'heartpy'], default='vectorized',
+                        help="'vectorized' detects the beats once and computes all windows from cumulative sums, "
+                             "'streaming' replays the live running HRV window by window, 'heartpy' runs hp.process per window")
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: number of CPUs)')
+    args = parser.parse_args(argv)
+
+    tasks = find_recordings(args.inputs, args.fs)
+    if len(tasks) == 0:
+        print('No recordings found in: ' + ', '.join(args.inputs))
+        return 1
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(process_recording, task, args.engine, args.window, args.step) for task in tasks]
+        for task, future in zip(tasks, futures):
+            try:
+                rows.extend(future.result())
+            except Exception as e:
+                print('Failed to process ' + task['label'] + ': ' + repr(e))
+
+    out_dir = args.out_dir if args.out_dir is not None else args.inputs[0]
+    os.makedirs(out_dir, exist_ok=True)
+    write_csv(os.path.join(out_dir, 'windows.csv'), rows,
+              ['recording', 'experiment', 'condition', 'channel', 'window_end'] + HRV_MEASURES)
+    write_csv(os.path.join(out_dir, 'summary.csv'), summarize(rows),
+              ['experiment', 'condition', 'channel', 'n_recordings', 'n_windows'] + HRV_MEASURES)
+    print('Processed ' + str(len(tasks)) + ' recordings, ' + str(len(rows)) + ' windows -> ' + out_dir)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
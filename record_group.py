@@ -0,0 +1,157 @@
+# This Python file uses the following encoding: utf-8
+# Headless acquisition from several boards at once, e.g. for group sessions with one sensor per
+# participant.
+#
+#   python record_group.py --port /dev/ttyACM0 --port /dev/ttyACM1 --experiment Group --condition Baseline
+#   python record_group.py --simulate 4 --channels 4 --duration 60      16 simulated participants
+#
+# Every board is read by its own thread (devices.deviceReader) and put on a shared clock; the
+# boards are resampled onto one grid at --fs and merged into a (n_samples, n_channels) stream,
+# channels in the order of the ports. The merged stream is filtered and analysed per channel
+# (multichannel.channelBank) and saved as one session (see utils/session_format.py): raw_signal.npy
+# has one column per participant, and features carry one channel index per participant.
+# --metrics FILE writes pipeline metrics periodically (see utils/metrics.py), --stream PORT
+# publishes the filtered channels and the features per channel (see utils/streaming.py).
+import argparse
+import calendar
+import queue
+import time
+from datetime import datetime
+import numpy as np
+
+from utils.devices import deviceReader, sharedClock
+from utils.feature_store import featureStore
+from utils.hrv_lib import HRV_MEASURES
+from utils.metrics import pipelineMetrics, metricsExporter
+from utils.multichannel import groupAligner, channelBank
+from utils.session_format import sessionWriter
+from utils.sources import syntheticPPG, ptyDevice
+from utils.streaming import streamServer
+
+
+def utc_now():
+    return calendar.timegm(datetime.utcnow().timetuple())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Record PPG from several boards into one session.')
+    parser.add_argument('--port', action='append', default=[], help='serial port of a board (repeat for more boards)')
+    parser.add_argument('--simulate', type=int, default=0, help='add this many simulated boards')
+    parser.add_argument('--channels', type=int, default=1, help='channels per simulated board')
+    parser.add_argument('--fs', type=float, default=100, help='sampling rate of the merged stream (Hz)')
+    parser.add_argument('--experiment', default='Group')
+    parser.add_argument('--condition', default='Baseline')
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--duration', type=float, default=None, help='seconds to record (default: until Ctrl+C)')
+    parser.add_argument('--window', type=float, default=20.0, help='HRV window (s)')
+    parser.add_argument('--measure-time', type=float, default=5.0, help='seconds between feature updates')
+    parser.add_argument('--metrics', default=None,
+                        help='write pipeline metrics to this file: Prometheus text for *.prom, else JSON lines')
+    parser.add_argument('--metrics-interval', type=float, default=10.0, help='seconds between metrics writes')
+    parser.add_argument('--stream', type=int, default=None, metavar='PORT',
+                        help='publish filtered samples and features on this TCP port')
+    parser.add_argument('--stream-host', default='127.0.0.1', help='interface to publish on')
+    args = parser.parse_args(argv)
+
+    simulators = []
+    ports = list(args.port)
+    for i in range(args.simulate):
+        device = ptyDevice(syntheticPPG(rate=args.fs, hr=60.0 + 10.0 * i, n_channels=args.channels, seed=i))
+        ports.append(device.start())
+        simulators.append(device)
+    if len(ports) == 0:
+        print('No boards given; use --port or --simulate')
+        return 1
+
+    clock = sharedClock()
+    blocks = queue.Queue()
+    metrics = pipelineMetrics()
+
+    def on_block(reader, x, t):
+        blocks.put((reader.device_id, x, t))
+        metrics.count('samples_received', x.shape[0])
+        return
+
+    readers = [deviceReader(port, on_block, clock, device_id=i, nominal_fs=args.fs) for i, port in enumerate(ports)]
+    aligner = groupAligner(args.fs, [r.device_id for r in readers])
+    metrics.add_collector(lambda: {
+        'queue_depth': blocks.qsize(),
+        'read_errors': sum(r.errors for r in readers),
+        'parse_errors': sum(r.spObj.parse_errors for r in readers),
+        'dropped_samples': sum(r.spObj.decoder.dropped_samples for r in readers)})
+    exporter = metricsExporter(metrics, args.metrics, args.metrics_interval) if args.metrics is not None else None
+    stream = None
+    if args.stream is not None:
+        stream = streamServer(args.stream, args.stream_host)
+        host, port = stream.start()
+        print('Streaming on ' + host + ':' + str(port))
+    unix_offset = time.time() - time.monotonic()    # shared clock (monotonic) -> Unix time
+    start_utc = utc_now()
+    writer = sessionWriter(args.data_dir, args.experiment, [args.condition], args.fs, start_utc)
+    writer.start_segment(args.condition, start_utc, args.fs)
+    store = featureStore([args.condition])
+    bank = None
+
+    for reader in readers:
+        reader.start()
+    if exporter is not None:
+        exporter.start()
+    print('Recording ' + str(len(ports)) + ' boards to ' + writer.path + ' (Ctrl+C to stop)')
+    started = time.monotonic()
+    next_features = started + args.measure_time
+    try:
+        while args.duration is None or time.monotonic() - started < args.duration:
+            try:
+                device_id, x, t = blocks.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            merged = aligner.add(device_id, x, t)
+            if merged is None:
+                continue
+            t_grid, values = merged
+            if bank is None:
+                bank = channelBank(args.fs, values.shape[1], window=args.window)
+            start = time.perf_counter()
+            filtered = bank.process(values)
+            metrics.observe('filter', time.perf_counter() - start)
+            if stream is not None:
+                stream.publish_samples(unix_offset + t_grid[0], 1.0 / args.fs, filtered)
+            metrics.count('samples_processed', values.shape[0])
+            writer.write(values)
+            if time.monotonic() >= next_features:
+                next_features += args.measure_time
+                start = time.perf_counter()
+                measures = bank.measures()
+                metrics.observe('features', time.perf_counter() - start)
+                timestamp = time.time()
+                store.append_channels(args.condition, measures, timestamp)
+                if stream is not None:
+                    for ch in range(measures.shape[0]):
+                        if not np.isnan(measures[ch, 0]):
+                            stream.publish_features(timestamp, args.condition, dict(zip(HRV_MEASURES, measures[ch])), ch)
+                print('bpm per channel: ' + ' '.join('%5.1f' % v for v in measures[:, HRV_MEASURES.index('bpm')]))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for reader in readers:
+            reader.stop()
+        for device in simulators:
+            device.stop()
+        if exporter is not None:
+            exporter.stop()
+        if stream is not None:
+            stream.stop()
+        writer.end_segment(utc_now(), args.fs)
+        writer.write_features(store)
+        writer.close()
+    for reader in readers:
+        if reader.errors > 0:
+            print('Board ' + str(reader.port_name) + ': ' + str(reader.errors) + ' read errors, ' + str(reader.reconnects) +
+                  ' reconnects, last: ' + repr(reader.last_error))
+    print('Saved ' + str(writer.n_queued) + ' samples of ' + str(0 if bank is None else bank.n_channels) +
+          ' channels to ' + writer.path)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,77 @@
+import threading
+import types
+
+from matplotlib.figure import Figure
+
+from plots import BarLayout, FeaturesFigCanvas
+from utils.hrv_lib import HRV_MEASURES
+from utils.session import AcquisitionSession
+
+
+def make_canvas(session):
+    # prepare_summary only needs the session and the counts of the last summary
+    return types.SimpleNamespace(uiObj=types.SimpleNamespace(session=session), summary_counts={})
+
+
+def add(session, condition, value):
+    session.add_features(condition, {m: value for m in HRV_MEASURES}, 0.0)
+    return
+
+
+def test_summary_after_reset_only_shows_the_new_conditions():
+    session = AcquisitionSession(['rest', 'task'])
+    canvas = make_canvas(session)
+    add(session, 'rest', 1.0)
+    assert list(FeaturesFigCanvas.prepare_summary(canvas)['medians']) == ['rest']
+
+    add(session, 'task', 2.0)
+    session.reset_features(['before', 'after'])
+    add(session, 'after', 3.0)
+    summary = FeaturesFigCanvas.prepare_summary(canvas)
+    assert summary == {'reset': True, 'conditions': ['before', 'after']}
+    summary = FeaturesFigCanvas.prepare_summary(canvas)
+    assert list(summary['medians']) == ['after']
+    assert summary['medians']['after'][HRV_MEASURES[0]] == 3.0
+
+
+class resettingSession(AcquisitionSession):
+    # The experiment changes (Qt thread) right after the summary worker first looks at the store
+    def __init__(self, conditions, new_conditions) -> None:
+        self.new_conditions = new_conditions
+        self.hooked = False
+        self.reset_thread = None
+        super().__init__(conditions)
+
+    @property
+    def features(self):
+        store = self._features
+        if self.hooked:
+            self.hooked = False
+            self.reset_thread = threading.Thread(target=self.reset_features, args=(self.new_conditions,))
+            self.reset_thread.start()
+            self.reset_thread.join(0.2)
+        return store
+
+    @features.setter
+    def features(self, store):
+        self._features = store
+
+
+def test_reset_during_summary_does_not_pair_it_with_the_old_store():
+    session = resettingSession(['rest', 'task'], ['before', 'after'])
+    canvas = make_canvas(session)
+    add(session, 'rest', 1.0)
+    session.hooked = True
+    summaries = [FeaturesFigCanvas.prepare_summary(canvas)]
+    session.reset_thread.join()
+    summaries += [FeaturesFigCanvas.prepare_summary(canvas) for i in range(2)]
+    resets = [s for s in summaries if s is not None and s['reset']]
+    assert resets == [{'reset': True, 'conditions': ['before', 'after']}]
+
+
+def test_every_set_of_conditions_gets_its_own_axes():
+    fig = Figure()
+    first = BarLayout(fig, ['rest', 'task'], FeaturesFigCanvas.BAR_AXES)
+    second = BarLayout(fig, ['before', 'after'], FeaturesFigCanvas.BAR_AXES)
+    assert len(fig.axes) == 2 * len(FeaturesFigCanvas.BAR_AXES)
+    assert all(first.axes[m] is not second.axes[m] for m in first.axes)
@@ -0,0 +1,47 @@
+import types
+import numpy as np
+
+from plots import LiveSignal
+
+BLOCK = 10
+
+
+def make_signal(fs=100):
+    status = types.SimpleNamespace(setText=lambda text: None)
+    signal = LiveSignal()
+    signal.init_signal(types.SimpleNamespace(fs=fs, display_fps=30, label_status=status))
+    return signal
+
+
+def feed(signal, rate, seconds, t0, jitter=0.01):
+    # ASCII blocks (no device timestamps) arriving at `rate`, read a few ms late; returns the number
+    # of samples after resampling and the time of the last block
+    rng = np.random.default_rng(1)
+    n_out = 0
+    n_blocks = int(seconds * rate / BLOCK)
+    for b in range(n_blocks):
+        arrival = t0 + (b + 1) * BLOCK / rate + rng.uniform(0, jitter)
+        out = signal.track_sample_rate(np.zeros(BLOCK), None, arrival)
+        n_out += out.shape[0]
+    return n_out, t0 + n_blocks * BLOCK / rate
+
+
+def test_drift_is_resampled_onto_the_nominal_rate():
+    signal = make_signal()
+    n, t = feed(signal, 100.0, 10, 0.0)
+    assert signal.rate_calibrated and signal.uiObj.fs == 100
+    # the board speeds up by 6 %: once the estimate has followed, 30 s give 30 s of samples at 100 Hz
+    n, t = feed(signal, 106.0, 20, t)
+    assert signal.resampler is not None
+    n, t = feed(signal, 106.0, 30, t)
+    assert abs(n - 3000) <= BLOCK
+
+
+def test_reset_window_measures_the_rate_again():
+    signal = make_signal()
+    feed(signal, 100.0, 10, 0.0)
+    feed(signal, 106.0, 20, 10.0)
+    signal.reset_window()
+    assert not signal.rate_calibrated
+    assert signal.resampler is None
+    assert not signal.rate_estimator.settled
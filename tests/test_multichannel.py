@@ -0,0 +1,64 @@
+import numpy as np
+
+from utils.multichannel import groupAligner, channelBank
+
+FS = 100
+BLOCK = 10
+
+
+def feed(aligner, device_id, start, n_blocks, value):
+    # n_blocks blocks of one device starting at sample `start`; returns the merged output
+    out = []
+    for b in range(n_blocks):
+        i = start + b * BLOCK + np.arange(BLOCK)
+        result = aligner.add(device_id, np.full((BLOCK, 1), float(value)), i / FS)
+        if result is not None:
+            out.append(result)
+    return out
+
+
+def test_group_keeps_going_when_a_board_stops():
+    aligner = groupAligner(FS, [0, 1], timeout=1.0)
+    merged = []
+    # both boards for 2 s
+    for b in range(20):
+        merged += feed(aligner, 0, b * BLOCK, 1, 1)
+        merged += feed(aligner, 1, b * BLOCK, 1, 2)
+    n_both = sum(x.shape[0] for t, x in merged)
+    # board 1 stops, board 0 goes on for 5 s
+    stopped = feed(aligner, 0, 20 * BLOCK, 50, 1)
+    x = np.concatenate([x for t, x in stopped])
+    assert x.shape[0] >= 50 * BLOCK - (1.0 * FS + 2 * BLOCK)
+    assert np.all(x[:, 0] == 1)
+    assert np.isnan(x[-1, 1])
+    assert 1 in aligner.missing
+    assert all(sum(b.shape[0] for b in p) <= 1.0 * FS + BLOCK for p in aligner.pending.values())
+
+    # board 1 comes back: its samples land on the grid points they belong to
+    t_end = aligner.t_start + aligner.n_out / FS
+    back = feed(aligner, 1, 70 * BLOCK, 10, 2) + feed(aligner, 0, 70 * BLOCK, 10, 1)
+    assert 1 not in aligner.missing
+    t = np.concatenate([t for t, x in back])
+    x = np.concatenate([x for t, x in back])
+    assert np.all(np.diff(t) > 0) and t[0] >= t_end
+    assert np.all(x[t >= 70 * BLOCK / FS + 0.05, 1] == 2)
+    assert n_both > 0
+
+
+def test_board_without_data_is_left_out():
+    aligner = groupAligner(FS, [0, 1], timeout=1.0)
+    merged = feed(aligner, 0, 0, 20, 1)
+    assert aligner.device_ids == [0]
+    assert sum(x.shape[0] for t, x in merged) > 0
+    assert aligner.add(1, np.ones((BLOCK, 1)), np.arange(BLOCK) / FS) is None
+
+
+def test_channel_bank_recovers_after_missing_data():
+    bank = channelBank(FS, 2)
+    t = np.arange(30 * FS) / FS
+    x = np.stack([np.sin(2 * np.pi * 1.2 * t)] * 2, axis=1)
+    x[10 * FS:15 * FS, 1] = np.nan
+    filtered = np.concatenate([bank.process(x[i:i + BLOCK]) for i in range(0, x.shape[0], BLOCK)])
+    assert np.all(np.isnan(filtered[10 * FS:15 * FS, 1]))
+    assert np.all(np.isfinite(filtered[15 * FS:, 1]))
+    assert np.all(np.isfinite(filtered[:, 0]))
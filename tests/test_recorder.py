@@ -0,0 +1,27 @@
+import time
+import numpy as np
+import pytest
+
+from utils.recorder import streamingRecorder
+
+
+def test_multichannel_recording_survives_a_pause(tmp_path):
+    # No data for longer than fsync_interval between two blocks, e.g. between two conditions
+    path = str(tmp_path / 'raw.npy')
+    recorder = streamingRecorder(path, n_channels=2, fsync_interval=0.2)
+    first = np.arange(20, dtype=np.float32).reshape(10, 2)
+    second = -np.arange(10, dtype=np.float32).reshape(5, 2)
+    recorder.write(first)
+    time.sleep(0.5)
+    recorder.write(second)
+    recorder.close()
+    assert recorder.error is None
+    np.testing.assert_array_equal(np.load(path), np.concatenate((first, second)))
+
+
+def test_writer_failure_is_raised(tmp_path):
+    recorder = streamingRecorder(str(tmp_path / 'raw.npy'), n_channels=2, fsync_interval=0.2)
+    recorder.write(np.ones((10, 3)))    # wrong number of channels, fails in the writer thread
+    recorder.write(np.ones((10, 2)))
+    with pytest.raises(RuntimeError):
+        recorder.close()
@@ -0,0 +1,24 @@
+import threading
+
+from utils.workers import workerPool
+
+
+def test_submit_after_shutdown_keeps_its_slot():
+    pool = workerPool(max_pending=2)
+    pool.shutdown()
+    errors = []
+
+    def submit_all():
+        for i in range(5):
+            try:
+                pool.submit(print, i)
+            except RuntimeError as e:
+                errors.append(e)
+        return
+
+    thread = threading.Thread(target=submit_all, daemon=True)
+    thread.start()
+    thread.join(2.0)
+    assert not thread.is_alive()
+    assert len(errors) == 5
+
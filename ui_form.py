@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+################################################################################
+## Form generated from reading UI file 'form.ui'
+##
+## Created by: Qt User Interface Compiler version 6.12.0
+##
+## WARNING! All changes made in this file will be lost when recompiling UI file!
+################################################################################
+
+from PySide6.QtCore import (QCoreApplication, QDate, QDateTime, QLocale,
+    QMetaObject, QObject, QPoint, QRect,
+    QSize, QTime, QUrl, Qt)
+from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
+    QFont, QFontDatabase, QGradient, QIcon,
+    QImage, QKeySequence, QLinearGradient, QPainter,
+    QPalette, QPixmap, QRadialGradient, QTransform)
+from PySide6.QtWidgets import (QAbstractItemView, QApplication, QComboBox, QGraphicsView,
+    QGridLayout, QGroupBox, QLabel, QListView,
+    QListWidget, QListWidgetItem, QPushButton, QSizePolicy,
+    QWidget)
+
+class Ui_PPG(object):
+    def setupUi(self, PPG):
+        if not PPG.objectName():
+            PPG.setObjectName(u"PPG")
+        PPG.resize(1555, 798)
+        sizePolicy = QSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(PPG.sizePolicy().hasHeightForWidth())
+        PPG.setSizePolicy(sizePolicy)
+        self.gridLayout_2 = QGridLayout(PPG)
+        self.gridLayout_2.setObjectName(u"gridLayout_2")
+        self.groupBox_3 = QGroupBox(PPG)
+        self.groupBox_3.setObjectName(u"groupBox_3")
+        sizePolicy1 = QSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Minimum)
+        sizePolicy1.setHorizontalStretch(0)
+        sizePolicy1.setVerticalStretch(0)
+        sizePolicy1.setHeightForWidth(self.groupBox_3.sizePolicy().hasHeightForWidth())
+        self.groupBox_3.setSizePolicy(sizePolicy1)
+        self.gridLayout_8 = QGridLayout(self.groupBox_3)
+        self.gridLayout_8.setObjectName(u"gridLayout_8")
+        self.groupBox_6 = QGroupBox(self.groupBox_3)
+        self.groupBox_6.setObjectName(u"groupBox_6")
+        sizePolicy1.setHeightForWidth(self.groupBox_6.sizePolicy().hasHeightForWidth())
+        self.groupBox_6.setSizePolicy(sizePolicy1)
+        self.gridLayout_6 = QGridLayout(self.groupBox_6)
+        self.gridLayout_6.setObjectName(u"gridLayout_6")
+        self.comboBox_comport = QComboBox(self.groupBox_6)
+        self.comboBox_comport.setObjectName(u"comboBox_comport")
+
+        self.gridLayout_6.addWidget(self.comboBox_comport, 0, 1, 1, 1)
+
+        self.label_10 = QLabel(self.groupBox_6)
+        self.label_10.setObjectName(u"label_10")
+
+        self.gridLayout_6.addWidget(self.label_10, 0, 0, 1, 1)
+
+        self.pushButton_connect = QPushButton(self.groupBox_6)
+        self.pushButton_connect.setObjectName(u"pushButton_connect")
+        self.pushButton_connect.setEnabled(False)
+
+        self.gridLayout_6.addWidget(self.pushButton_connect, 1, 0, 1, 2)
+
+
+        self.gridLayout_8.addWidget(self.groupBox_6, 1, 0, 1, 1)
+
+        self.groupBox_7 = QGroupBox(self.groupBox_3)
+        self.groupBox_7.setObjectName(u"groupBox_7")
+        sizePolicy1.setHeightForWidth(self.groupBox_7.sizePolicy().hasHeightForWidth())
+        self.groupBox_7.setSizePolicy(sizePolicy1)
+        self.gridLayout_7 = QGridLayout(self.groupBox_7)
+        self.gridLayout_7.setObjectName(u"gridLayout_7")
+        self.pushButton_start_live_acquisition = QPushButton(self.groupBox_7)
+        self.pushButton_start_live_acquisition.setObjectName(u"pushButton_start_live_acquisition")
+        self.pushButton_start_live_acquisition.setEnabled(False)
+
+        self.gridLayout_7.addWidget(self.pushButton_start_live_acquisition, 1, 0, 1, 1)
+
+        self.pushButton_record_data = QPushButton(self.groupBox_7)
+        self.pushButton_record_data.setObjectName(u"pushButton_record_data")
+        self.pushButton_record_data.setEnabled(False)
+
+        self.gridLayout_7.addWidget(self.pushButton_record_data, 2, 0, 1, 1)
+
+
+        self.gridLayout_8.addWidget(self.groupBox_7, 2, 0, 1, 1)
+
+        self.groupBox_4 = QGroupBox(self.groupBox_3)
+        self.groupBox_4.setObjectName(u"groupBox_4")
+        sizePolicy1.setHeightForWidth(self.groupBox_4.sizePolicy().hasHeightForWidth())
+        self.groupBox_4.setSizePolicy(sizePolicy1)
+        self.gridLayout_5 = QGridLayout(self.groupBox_4)
+        self.gridLayout_5.setObjectName(u"gridLayout_5")
+        self.label_3 = QLabel(self.groupBox_4)
+        self.label_3.setObjectName(u"label_3")
+        sizePolicy1.setHeightForWidth(self.label_3.sizePolicy().hasHeightForWidth())
+        self.label_3.setSizePolicy(sizePolicy1)
+
+        self.gridLayout_5.addWidget(self.label_3, 2, 0, 1, 1)
+
+        self.pushButton_addExp = QPushButton(self.groupBox_4)
+        self.pushButton_addExp.setObjectName(u"pushButton_addExp")
+
+        self.gridLayout_5.addWidget(self.pushButton_addExp, 0, 0, 1, 2)
+
+        self.listWidget_expConditions = QListWidget(self.groupBox_4)
+        font = QFont()
+        font.setPointSize(8)
+        __qlistwidgetitem = QListWidgetItem(self.listWidget_expConditions)
+        __qlistwidgetitem.setCheckState(Qt.Unchecked)
+        __qlistwidgetitem.setFont(font)
+        __qlistwidgetitem.setFlags(Qt.ItemIsSelectable|Qt.ItemIsDragEnabled|Qt.ItemIsEnabled)
+        __qlistwidgetitem1 = QListWidgetItem(self.listWidget_expConditions)
+        __qlistwidgetitem1.setCheckState(Qt.Unchecked)
+        __qlistwidgetitem1.setFont(font)
+        __qlistwidgetitem1.setFlags(Qt.ItemIsSelectable|Qt.ItemIsDragEnabled|Qt.ItemIsEnabled)
+        __qlistwidgetitem2 = QListWidgetItem(self.listWidget_expConditions)
+        __qlistwidgetitem2.setCheckState(Qt.Unchecked)
+        self.listWidget_expConditions.setObjectName(u"listWidget_expConditions")
+        self.listWidget_expConditions.setEnabled(True)
+        sizePolicy1.setHeightForWidth(self.listWidget_expConditions.sizePolicy().hasHeightForWidth())
+        self.listWidget_expConditions.setSizePolicy(sizePolicy1)
+        font1 = QFont()
+        font1.setPointSize(8)
+        font1.setBold(False)
+        self.listWidget_expConditions.setFont(font1)
+        self.listWidget_expConditions.setMouseTracking(True)
+        self.listWidget_expConditions.setEditTriggers(QAbstractItemView.CurrentChanged|QAbstractItemView.DoubleClicked|QAbstractItemView.EditKeyPressed|QAbstractItemView.SelectedClicked)
+        self.listWidget_expConditions.setAlternatingRowColors(True)
+        self.listWidget_expConditions.setSpacing(1)
+        self.listWidget_expConditions.setViewMode(QListView.ListMode)
+        self.listWidget_expConditions.setSelectionRectVisible(False)
+        self.listWidget_expConditions.setSortingEnabled(False)
+
+        self.gridLayout_5.addWidget(self.listWidget_expConditions, 2, 1, 1, 1)
+
+        self.label_2 = QLabel(self.groupBox_4)
+        self.label_2.setObjectName(u"label_2")
+        sizePolicy1.setHeightForWidth(self.label_2.sizePolicy().hasHeightForWidth())
+        self.label_2.setSizePolicy(sizePolicy1)
+
+        self.gridLayout_5.addWidget(self.label_2, 1, 0, 1, 1)
+
+        self.comboBox_expName = QComboBox(self.groupBox_4)
+        self.comboBox_expName.addItem("")
+        self.comboBox_expName.setObjectName(u"comboBox_expName")
+        self.comboBox_expName.setEnabled(True)
+        sizePolicy1.setHeightForWidth(self.comboBox_expName.sizePolicy().hasHeightForWidth())
+        self.comboBox_expName.setSizePolicy(sizePolicy1)
+
+        self.gridLayout_5.addWidget(self.comboBox_expName, 1, 1, 1, 1)
+
+
+        self.gridLayout_8.addWidget(self.groupBox_4, 1, 1, 2, 1)
+
+        self.groupBox_2 = QGroupBox(self.groupBox_3)
+        self.groupBox_2.setObjectName(u"groupBox_2")
+        sizePolicy1.setHeightForWidth(self.groupBox_2.sizePolicy().hasHeightForWidth())
+        self.groupBox_2.setSizePolicy(sizePolicy1)
+        self.gridLayout = QGridLayout(self.groupBox_2)
+        self.gridLayout.setObjectName(u"gridLayout")
+        self.graphicsView_2 = QGraphicsView(self.groupBox_2)
+        self.graphicsView_2.setObjectName(u"graphicsView_2")
+        sizePolicy2 = QSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
+        sizePolicy2.setHorizontalStretch(0)
+        sizePolicy2.setVerticalStretch(0)
+        sizePolicy2.setHeightForWidth(self.graphicsView_2.sizePolicy().hasHeightForWidth())
+        self.graphicsView_2.setSizePolicy(sizePolicy2)
+
+        self.gridLayout.addWidget(self.graphicsView_2, 0, 0, 1, 1)
+
+
+        self.gridLayout_8.addWidget(self.groupBox_2, 1, 2, 2, 1)
+
+
+        self.gridLayout_2.addWidget(self.groupBox_3, 2, 0, 1, 1)
+
+        self.groupBox = QGroupBox(PPG)
+        self.groupBox.setObjectName(u"groupBox")
+        sizePolicy.setHeightForWidth(self.groupBox.sizePolicy().hasHeightForWidth())
+        self.groupBox.setSizePolicy(sizePolicy)
+        self.gridLayout_3 = QGridLayout(self.groupBox)
+        self.gridLayout_3.setObjectName(u"gridLayout_3")
+        self.graphicsView = QGraphicsView(self.groupBox)
+        self.graphicsView.setObjectName(u"graphicsView")
+        sizePolicy.setHeightForWidth(self.graphicsView.sizePolicy().hasHeightForWidth())
+        self.graphicsView.setSizePolicy(sizePolicy)
+
+        self.gridLayout_3.addWidget(self.graphicsView, 0, 0, 1, 1)
+
+
+        self.gridLayout_2.addWidget(self.groupBox, 1, 0, 1, 1)
+
+        self.label = QLabel(PPG)
+        self.label.setObjectName(u"label")
+        sizePolicy3 = QSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
+        sizePolicy3.setHorizontalStretch(0)
+        sizePolicy3.setVerticalStretch(0)
+        sizePolicy3.setHeightForWidth(self.label.sizePolicy().hasHeightForWidth())
+        self.label.setSizePolicy(sizePolicy3)
+        font2 = QFont()
+        font2.setPointSize(18)
+        self.label.setFont(font2)
+        self.label.setPixmap(QPixmap(u"images/banner.png"))
+        self.label.setScaledContents(True)
+        self.label.setAlignment(Qt.AlignCenter)
+        self.label.setMargin(-1)
+
+        self.gridLayout_2.addWidget(self.label, 0, 0, 1, 1)
+
+        self.groupBox_5 = QGroupBox(PPG)
+        self.groupBox_5.setObjectName(u"groupBox_5")
+        self.gridLayout_4 = QGridLayout(self.groupBox_5)
+        self.gridLayout_4.setObjectName(u"gridLayout_4")
+        self.label_4 = QLabel(self.groupBox_5)
+        self.label_4.setObjectName(u"label_4")
+        sizePolicy4 = QSizePolicy(QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Preferred)
+        sizePolicy4.setHorizontalStretch(0)
+        sizePolicy4.setVerticalStretch(0)
+        sizePolicy4.setHeightForWidth(self.label_4.sizePolicy().hasHeightForWidth())
+        self.label_4.setSizePolicy(sizePolicy4)
+
+        self.gridLayout_4.addWidget(self.label_4, 0, 0, 1, 1)
+
+        self.label_status = QLabel(self.groupBox_5)
+        self.label_status.setObjectName(u"label_status")
+        sizePolicy5 = QSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
+        sizePolicy5.setHorizontalStretch(0)
+        sizePolicy5.setVerticalStretch(0)
+        sizePolicy5.setHeightForWidth(self.label_status.sizePolicy().hasHeightForWidth())
+        self.label_status.setSizePolicy(sizePolicy5)
+
+        self.gridLayout_4.addWidget(self.label_status, 0, 1, 1, 1)
+
+        self.label_5 = QLabel(self.groupBox_5)
+        self.label_5.setObjectName(u"label_5")
+        sizePolicy4.setHeightForWidth(self.label_5.sizePolicy().hasHeightForWidth())
+        self.label_5.setSizePolicy(sizePolicy4)
+
+        self.gridLayout_4.addWidget(self.label_5, 1, 0, 1, 1)
+
+        self.label_metrics = QLabel(self.groupBox_5)
+        self.label_metrics.setObjectName(u"label_metrics")
+        sizePolicy5.setHeightForWidth(self.label_metrics.sizePolicy().hasHeightForWidth())
+        self.label_metrics.setSizePolicy(sizePolicy5)
+
+        self.gridLayout_4.addWidget(self.label_metrics, 1, 1, 1, 1)
+
+
+        self.gridLayout_2.addWidget(self.groupBox_5, 3, 0, 1, 1)
+
+
+        self.retranslateUi(PPG)
+
+        self.listWidget_expConditions.setCurrentRow(-1)
+
+
+        QMetaObject.connectSlotsByName(PPG)
+    # setupUi
+
+    def retranslateUi(self, PPG):
+        PPG.setWindowTitle(QCoreApplication.translate("PPG", u"PPG", None))
+        self.groupBox_3.setTitle(QCoreApplication.translate("PPG", u"Experiment Control and Analysis", None))
+        self.groupBox_6.setTitle(QCoreApplication.translate("PPG", u"Device Setup", None))
+        self.label_10.setText(QCoreApplication.translate("PPG", u"Com Port", None))
+        self.pushButton_connect.setText(QCoreApplication.translate("PPG", u"Connect", None))
+        self.groupBox_7.setTitle(QCoreApplication.translate("PPG", u"Running Experiment", None))
+        self.pushButton_start_live_acquisition.setText(QCoreApplication.translate("PPG", u"Start Live Acquisition", None))
+        self.pushButton_record_data.setText(QCoreApplication.translate("PPG", u"Record Data", None))
+        self.groupBox_4.setTitle(QCoreApplication.translate("PPG", u"Experiment Specification", None))
+        self.label_3.setText(QCoreApplication.translate("PPG", u"Experimental Conditions", None))
+        self.pushButton_addExp.setText(QCoreApplication.translate("PPG", u"Add Experiment", None))
+
+        __sortingEnabled = self.listWidget_expConditions.isSortingEnabled()
+        self.listWidget_expConditions.setSortingEnabled(False)
+        ___qlistwidgetitem = self.listWidget_expConditions.item(0)
+        ___qlistwidgetitem.setText(QCoreApplication.translate("PPG", u"Baseline", None))
+        ___qlistwidgetitem1 = self.listWidget_expConditions.item(1)
+        ___qlistwidgetitem1.setText(QCoreApplication.translate("PPG", u"Condition_1", None))
+        ___qlistwidgetitem2 = self.listWidget_expConditions.item(2)
+        ___qlistwidgetitem2.setText(QCoreApplication.translate("PPG", u"Condition_2", None))
+        self.listWidget_expConditions.setSortingEnabled(__sortingEnabled)
+
+        self.label_2.setText(QCoreApplication.translate("PPG", u"Name of Experiment:", None))
+        self.comboBox_expName.setItemText(0, QCoreApplication.translate("PPG", u"Study_1", None))
+
+        self.groupBox_2.setTitle(QCoreApplication.translate("PPG", u"Analysis: Physiological parameters under different experimental conditions", None))
+        self.groupBox.setTitle(QCoreApplication.translate("PPG", u"Blood Volume Pulse Signal", None))
+        self.label.setText("")
+        self.groupBox_5.setTitle(QCoreApplication.translate("PPG", u"Info", None))
+        self.label_4.setText(QCoreApplication.translate("PPG", u"Log", None))
+        self.label_status.setText("")
+        self.label_5.setText(QCoreApplication.translate("PPG", u"Pipeline", None))
+        self.label_metrics.setText("")
+    # retranslateUi
+
@@ -0,0 +1,62 @@
+import numpy as np
+
+# Single-producer / single-consumer ring buffer for the live signal window.
+# Storage is mirrored: every sample is written at index i and i + capacity, so the latest
+# `capacity` samples are always one contiguous slice and can be handed to the plot (or to
+# np.min / np.max) as a zero-copy view, without any np.roll.
+# The producer fills the samples first and only then publishes them by advancing `count`,
+# so a consumer on another thread never sees unwritten samples. No locks are taken.
+
+
+class ringBuffer():
+    def __init__(self, capacity, n_channels=None, dtype=np.float64, fill=0.0) -> None:
+        self.capacity = int(capacity)
+        if n_channels is None:
+            shape = (2 * self.capacity,)
+        else:
+            shape = (2 * self.capacity, n_channels)
+        self.buf = np.full(shape, fill, dtype=dtype)
+        self.count = 0  # total samples written so far; write index is count % capacity
+
+    def write(self, values):
+        # values: a single sample or a block of samples (n_samples[, n_channels])
+        values = np.asarray(values, dtype=self.buf.dtype)
+        if values.ndim == self.buf.ndim - 1:
+            values = values[np.newaxis]
+        n = values.shape[0]
+        if n == 0:
+            return
+        skipped = 0
+        if n > self.capacity:
+            # Only the newest `capacity` samples can be kept
+            skipped = n - self.capacity
+            values = values[skipped:]
+
+        cap = self.capacity
+        start = (self.count + skipped) % cap
+        m = values.shape[0]
+        first = min(m, cap - start)
+        self.buf[start:start + first] = values[:first]
+        self.buf[start + cap:start + cap + first] = values[:first]
+        rest = m - first
+        if rest > 0:
+            self.buf[:rest] = values[first:]
+            self.buf[cap:cap + rest] = values[first:]
+        self.count += n
+        return
+
+    def view(self, n=None, count=None):
+        # Latest n samples (default: the whole window), oldest first, as a view into the buffer.
+        # Pass a previously read `count` to get a view consistent with that snapshot.
+        if count is None:
+            count = self.count
+        if n is None or n > self.capacity:
+            n = self.capacity
+        end = (count % self.capacity) + self.capacity
+        return self.buf[end - n:end]
+
+    def reset(self, fill=0.0):
+        # Only call this while the producer is stopped
+        self.buf[...] = fill
+        self.count = 0
+        return
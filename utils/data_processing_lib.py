@@ -1,8 +1,14 @@
 import numpy as np
-from scipy.signal import butter	#, lfilter, periodogram
+# scipy.signal is imported on first use: it takes longer to import than the rest of the application
+
+# Pass band and order of the PPG filter, shared by the live view and offline processing
+PPG_LOWCUT = 0.5
+PPG_HIGHCUT = 5.0
+PPG_FILTER_ORDER = 2
 
 class lFilter:
-	def __init__(self, lowcut, highcut, sample_rate, order=2):
+	def __init__(self, lowcut, highcut, sample_rate, order=2, use_sos=True):
+		from scipy.signal import butter
 		nyq = 0.5 * sample_rate
 		low = lowcut / nyq
 		high = highcut / nyq
@@ -12,6 +18,12 @@ class lFilter:
 		self.order = len(self.coefA) - 1
 		self.z = [0] * self.order
 
+		# Block engine: second-order sections (numerically robust for higher orders) or the same
+		# transposed direct-form recursion as lfilt (bit-identical to the per-sample path).
+		self.use_sos = use_sos
+		self.sos = butter(order, [low, high], btype='band', output='sos')
+		self.zi = None      # carried state, allocated on the first block to match its channel count
+
 	def lfilt(self, data):
 		y = (data * self.coefB[0]) + self.z[0]
 		for i in range(0, self.order):
@@ -21,6 +33,38 @@ class lFilter:
 				self.z[i] = (data * self.coefB[i+1]) - (self.coefA[i+1] * y)
 		return y
 
+	def process_block(self, x):
+		# x: (n_samples,) for a single channel or (n_samples, n_channels); filtering runs along axis 0
+		# and the state is carried across calls, so the output does not depend on how the stream is chunked.
+		from scipy.signal import lfilter, sosfilt
+		x = np.asarray(x, dtype=np.float64)
+		if x.shape[0] == 0:
+			return x.copy()
+		if self.zi is None or self.zi.shape != self._state_shape(x):
+			self.zi = np.zeros(self._state_shape(x))
+		if self.use_sos:
+			y, self.zi = sosfilt(self.sos, x, axis=0, zi=self.zi)
+		else:
+			y, self.zi = lfilter(self.coefB, self.coefA, x, axis=0, zi=self.zi)
+		return y
+
+	def _state_shape(self, x):
+		if self.use_sos:
+			return (self.sos.shape[0], 2) + x.shape[1:]
+		return (self.order,) + x.shape[1:]
+
+	def filtfilt(self, x):
+		# Offline zero-phase filtering of a saved recording (does not touch the streaming state).
+		from scipy.signal import filtfilt, sosfiltfilt
+		x = np.asarray(x, dtype=np.float64)
+		if self.use_sos:
+			return sosfiltfilt(self.sos, x, axis=0)
+		return filtfilt(self.coefB, self.coefA, x, axis=0)
+
+	def reset(self):
+		self.z = [0] * self.order
+		self.zi = None
+
 
 # def butter_bandpass_filter(data, lowcut, highcut, sample_rate, order=2):
 #     b, a = butter_bandpass(lowcut, highcut, sample_rate, order=order)
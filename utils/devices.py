@@ -1,6 +1,13 @@
+import collections
+import threading
+import time
+import numpy as np
 import serial
 import serial.tools.list_ports as lp
 
+from utils.protocol import binaryFrameDecoder, CMD_BINARY
+from utils.timing import sampleRateEstimator
+
 # Refer below link if you get an error for permission denied while using Ubuntu/ Linux
 # https: // askubuntu.com/questions/210177/serial-port-terminal-cannot-open-dev-ttys0-permission-denied
 # Briefly:
@@ -14,14 +21,312 @@ class serialPort():
         self.baudrate = 115200 #57600 for AFE_4490 #9600 for PulseSensor
         self.timeout = 10  # specify timeout when using readline()
         self.ports = lp.comports()
+        self.partial_line = b''  # bytes of an incomplete line carried over to the next read
+        self.parse_errors = 0
+        # 'auto' asks the board for binary frames on the first read and falls back to ASCII lines
+        # if none arrive; 'ascii' and 'binary' skip the negotiation
+        self.protocol_preference = 'auto'
+        self.protocol = self.protocol_preference
+        self.negotiation_timeout = 3.0  # seconds, covers the bootloader delay of boards that reset on open
+        self.decoder = binaryFrameDecoder()
+        self.n_channels = 1
 
     def connectPort(self, port_name):
         self.ser.port = port_name  # "/dev/cu.usbmodem14101" # 'COM3'  # Arduino serial port
         self.ser.baudrate = self.baudrate
         self.ser.timeout = self.timeout  # specify timeout when using readline()
         self.ser.open()
+        self.partial_line = b''
+        self.decoder.reset()
+        self.protocol = self.protocol_preference
+        if self.protocol == 'binary':
+            self.ser.write(CMD_BINARY)
         return self.ser.is_open
 
     def disconnectPort(self):
         self.ser.close()
         return
+
+    def reconnect(self):
+        # Reopens the port after an error (e.g. the board was unplugged and plugged in again)
+        self.ser.close()
+        return self.connectPort(self.ser.port)
+
+    def cancelRead(self):
+        # Makes a read waiting for data return at once; called from another thread
+        if self.ser.is_open:
+            self.ser.cancel_read()
+        return
+
+    def readBlock(self):
+        # Returns (samples, device timestamps in microseconds); timestamps are None for ASCII data.
+        # Block until at least one byte arrives (or the timeout expires), then take everything
+        # that is already waiting in a single call, and parse all complete lines / frames at once.
+        if self.protocol == 'auto':
+            return self.negotiate()
+        data = self.ser.read(1)
+        n_waiting = self.ser.in_waiting
+        if n_waiting > 0:
+            data += self.ser.read(n_waiting)
+        if self.protocol == 'binary':
+            return self.decodeBinary(data)
+        return self.parseAscii(data), None
+
+    def negotiate(self):
+        # Keep requesting binary frames until the first valid frame is decoded; a board that only
+        # speaks ASCII ignores the request, so fall back to lines once the timeout expires.
+        self.ser.timeout = 0.1
+        received = b''
+        deadline = time.monotonic() + self.negotiation_timeout
+        next_request = 0.0
+        try:
+            while time.monotonic() < deadline:
+                if time.monotonic() >= next_request:
+                    self.ser.write(CMD_BINARY)
+                    next_request = time.monotonic() + 0.5
+                data = self.ser.read(max(1, self.ser.in_waiting))
+                received += data
+                samples, t_us = self.decodeBinary(data)
+                if self.decoder.frames > 0:
+                    self.protocol = 'binary'
+                    return samples, t_us
+        finally:
+            self.ser.timeout = self.timeout
+        self.protocol = 'ascii'
+        self.decoder.reset()
+        # Drop the first (possibly truncated) line
+        received = received[received.find(b'\n') + 1:]
+        return self.parseAscii(received), None
+
+    def decodeBinary(self, data):
+        samples, t_us = self.decoder.decode(data)
+        if samples.shape[1] == 1:
+            samples = samples[:, 0]
+        return samples, t_us
+
+    def parseAscii(self, data):
+        # One value per line, or several channels per line separated by commas / tabs; returns
+        # (n_samples,) for a single channel and (n_samples, n_channels) otherwise
+        data = self.partial_line + data
+        end = data.rfind(b'\n')
+        if end < 0:
+            self.partial_line = data
+            return np.empty(0)
+        self.partial_line = data[end + 1:]
+        lines = data[:end + 1]
+        if b',' in lines or b'\t' in lines:
+            return self.parseColumns(lines.replace(b'\t', b','))
+        tokens = lines.split()
+        if len(tokens) == 0:
+            return np.empty(0)
+        self.n_channels = 1
+        try:
+            return np.array(tokens).astype(np.float64)
+        except ValueError:
+            # Slow path, only taken when the block holds a corrupted line
+            values = []
+            for tk in tokens:
+                try:
+                    values.append(float(tk))
+                except ValueError:
+                    self.parse_errors += 1
+            return np.array(values, dtype=np.float64)
+
+    def parseColumns(self, lines):
+        rows = [ln for ln in lines.splitlines() if len(ln.strip()) > 0]
+        if len(rows) == 0:
+            return np.empty((0, self.n_channels))
+        n_ch = rows[-1].count(b',') + 1
+        self.n_channels = n_ch
+        try:
+            return np.array(b','.join(rows).split(b',')).astype(np.float64).reshape(len(rows), n_ch)
+        except ValueError:
+            # Slow path: drop lines that do not parse or have a different number of channels
+            values = []
+            for ln in rows:
+                try:
+                    row = [float(tk) for tk in ln.split(b',')]
+                except ValueError:
+                    row = []
+                if len(row) == n_ch:
+                    values.append(row)
+                else:
+                    self.parse_errors += 1
+            return np.array(values, dtype=np.float64).reshape(len(values), n_ch)
+
+
+# Common time base for several boards. Each board's timestamps (microseconds of its own clock)
+# are mapped onto time.monotonic() of this process. The offset host - device of a block is
+# delayed by transfer and scheduling, never advanced, so the smallest offset seen within the
+# last `window` seconds is the best estimate; the window lets the estimate follow clock drift.
+class sharedClock():
+    def __init__(self, window=30.0) -> None:
+        self.window = window
+        self.lock = threading.Lock()
+        self.offsets = {}   # device id -> deque of (host time, offset), offsets increasing
+
+    def to_host(self, device_id, t_us, host_time):
+        # t_us: device timestamps of a block that arrived at host_time; returns host times in seconds
+        t = np.asarray(t_us, dtype=np.float64) * 1e-6
+        offset = host_time - t[-1]
+        with self.lock:
+            q = self.offsets.setdefault(device_id, collections.deque())
+            while len(q) > 0 and q[-1][1] >= offset:
+                q.pop()
+            q.append((host_time, offset))
+            while q[0][0] < host_time - self.window:
+                q.popleft()
+            best = q[0][1]
+        return t + best
+
+    def reset(self, device_id=None):
+        with self.lock:
+            if device_id is None:
+                self.offsets.clear()
+            else:
+                self.offsets.pop(device_id, None)
+        return
+
+
+# Reads one board on its own thread (a blockReader, so a lost board is reopened and stop() cancels
+# a read in progress). Every block is passed to callback(reader, samples, t) with samples as
+# (n_samples, n_channels) and t the sample times on the shared clock; boards without device
+# timestamps (ASCII) get arrival times spaced by their measured sampling rate.
+class deviceReader():
+    def __init__(self, port_name, callback, clock, device_id=None, spObj=None, nominal_fs=100.0, retry_time=1.0) -> None:
+        self.port_name = port_name
+        self.callback = callback
+        self.clock = clock
+        self.device_id = port_name if device_id is None else device_id
+        self.spObj = serialPort() if spObj is None else spObj
+        self.nominal_fs = nominal_fs   # used until the sampling rate has been measured
+        self.rate_estimator = sampleRateEstimator()
+        self.reader = blockReader(self.spObj, self._on_block, self._on_error, retry_time)
+        self.restarted = False      # the board may have been reset: its clock and rate start over
+        self.n_samples = 0
+
+    @property
+    def errors(self):
+        return self.reader.errors
+
+    @property
+    def reconnects(self):
+        return self.reader.reconnects
+
+    @property
+    def last_error(self):
+        return self.reader.last_error
+
+    def start(self):
+        self.spObj.connectPort(self.port_name)
+        self.reader.start()
+        self.reader.resume()
+        return
+
+    def stop(self):
+        self.reader.close()
+        self.spObj.disconnectPort()
+        return
+
+    def _on_error(self, e):
+        self.restarted = True
+        return
+
+    def _on_block(self, samples, t_us, host_time):
+        if self.restarted:
+            self.restarted = False
+            self.clock.reset(self.device_id)
+            self.rate_estimator.reset()
+        n = samples.shape[0]
+        if samples.ndim == 1:
+            samples = samples[:, np.newaxis]
+        fs = self.rate_estimator.update(n, t_us, host_time)
+        if not self.rate_estimator.settled:
+            fs = self.nominal_fs
+        if t_us is not None:
+            t = self.clock.to_host(self.device_id, t_us, host_time)
+        else:
+            t = host_time - (n - 1 - np.arange(n)) / fs
+        self.n_samples += n
+        self.callback(self, samples, t)
+        return
+
+
+# Reads blocks from a serialPort (or anything with its readBlock / reconnect / cancelRead
+# interface) on a thread that waits on events instead of polling: while paused it sleeps until
+# resume(), pause() and close() cancel a read in progress, so starting and stopping take effect
+# at once. Non-empty blocks go to on_block(samples, t_us, arrival), arrival being the
+# time.monotonic() at which the block was read, before any queueing downstream. A failed read is
+# passed to on_error(exception) and the port is reopened every retry_time seconds until that
+# succeeds or reading is paused; nothing is put into the stream for the lost stretch.
+class blockReader():
+    def __init__(self, spObj, on_block, on_error=None, retry_time=1.0) -> None:
+        self.spObj = spObj
+        self.on_block = on_block
+        self.on_error = on_error
+        self.retry_time = retry_time
+        self.active = threading.Event()     # reading enabled
+        self.wake = threading.Event()       # pause / close while waiting to reconnect
+        self.closing = False
+        self.thread = None
+        self.errors = 0
+        self.reconnects = 0
+        self.last_error = None
+
+    def start(self):
+        self.thread = threading.Thread(name='blockReader', target=self._run, daemon=True)
+        self.thread.start()
+        return
+
+    def resume(self):
+        self.active.set()
+        return
+
+    def pause(self):
+        self.active.clear()
+        self.wake.set()
+        self.spObj.cancelRead()
+        return
+
+    def close(self):
+        self.closing = True
+        self.pause()
+        self.active.set()   # let the thread see closing
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        return
+
+    def _run(self):
+        while True:
+            self.active.wait()
+            if self.closing:
+                break
+            try:
+                samples, t_us = self.spObj.readBlock()
+                arrival = time.monotonic()
+            except Exception as e:
+                if not self.active.is_set():
+                    continue    # port closed or read cancelled on purpose
+                self.errors += 1
+                self.last_error = e
+                if self.on_error is not None:
+                    self.on_error(e)
+                self._reconnect()
+                continue
+            if samples.shape[0] > 0:
+                self.on_block(samples, t_us, arrival)
+        return
+
+    def _reconnect(self):
+        self.wake.clear()
+        while self.active.is_set() and not self.closing:
+            if self.wake.wait(self.retry_time):
+                break
+            try:
+                if self.spObj.reconnect():
+                    self.reconnects += 1
+                    break
+            except Exception as e:
+                self.last_error = e
+        return
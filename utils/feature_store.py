@@ -0,0 +1,116 @@
+import heapq
+import threading
+import numpy as np
+
+from utils.hrv_lib import HRV_MEASURES
+
+# One row per feature computation: wall-clock timestamp (seconds since the epoch), sensor channel
+# (participant) plus the HRV measures
+FEATURE_DTYPE = np.dtype([('timestamp', 'f8'), ('channel', 'i2')] + [(m, 'f8') for m in HRV_MEASURES])
+
+
+# Running median with two heaps: `low` is a max-heap (stored negated) holding the smaller half,
+# `high` a min-heap holding the larger half. O(log n) per add, O(1) per query.
+class runningMedian():
+    def __init__(self) -> None:
+        self.low = []
+        self.high = []
+
+    def add(self, value):
+        if len(self.low) == 0 or value <= -self.low[0]:
+            heapq.heappush(self.low, -value)
+        else:
+            heapq.heappush(self.high, value)
+        if len(self.low) > len(self.high) + 1:
+            heapq.heappush(self.high, -heapq.heappop(self.low))
+        elif len(self.high) > len(self.low):
+            heapq.heappush(self.low, -heapq.heappop(self.high))
+        return
+
+    def median(self):
+        if len(self.low) == 0:
+            return np.nan
+        if len(self.low) > len(self.high):
+            return -self.low[0]
+        return 0.5 * (-self.low[0] + self.high[0])
+
+
+# Columnar store of the features computed per experiment condition. Each condition owns one
+# structured array whose capacity doubles when full, so appends are amortised O(1); medians per
+# channel and measure are maintained incrementally. Rows below the current size are never modified, so the
+# arrays returned by records() stay valid after later appends.
+class featureStore():
+    def __init__(self, conditions=(), initial_capacity=64) -> None:
+        self.lock = threading.Lock()
+        self.initial_capacity = initial_capacity
+        self.data = {}
+        self.sizes = {}
+        self.medians = {}
+        for cnd in conditions:
+            self.add_condition(cnd)
+
+    def add_condition(self, cnd):
+        with self.lock:
+            if cnd not in self.data:
+                self.data[cnd] = np.zeros(self.initial_capacity, dtype=FEATURE_DTYPE)
+                self.sizes[cnd] = 0
+                self.medians[cnd] = {}
+        return
+
+    def conditions(self):
+        return list(self.data.keys())
+
+    def append(self, cnd, measures, timestamp, channel=0):
+        # measures: dict with the HRV_MEASURES keys
+        with self.lock:
+            n = self.sizes[cnd]
+            if n == self.data[cnd].shape[0]:
+                grown = np.zeros(2 * n, dtype=FEATURE_DTYPE)
+                grown[:n] = self.data[cnd]
+                self.data[cnd] = grown
+            row = self.data[cnd][n:n + 1]
+            row['timestamp'] = timestamp
+            row['channel'] = channel
+            medians = self.medians[cnd].get(channel)
+            if medians is None:
+                medians = self.medians[cnd][channel] = {m: runningMedian() for m in HRV_MEASURES}
+            for m in HRV_MEASURES:
+                row[m] = measures[m]
+                medians[m].add(float(measures[m]))
+            self.sizes[cnd] = n + 1
+        return
+
+    def append_channels(self, cnd, measures, timestamp):
+        # measures: (n_channels, len(HRV_MEASURES)) as from channelBank.measures(); NaN rows are skipped
+        for ch in range(measures.shape[0]):
+            if not np.isnan(measures[ch]).any():
+                self.append(cnd, dict(zip(HRV_MEASURES, measures[ch])), timestamp, channel=ch)
+        return
+
+    def count(self, cnd):
+        return self.sizes[cnd]
+
+    def channels(self, cnd):
+        with self.lock:
+            return sorted(self.medians[cnd].keys())
+
+    def records(self, cnd):
+        with self.lock:
+            return self.data[cnd][:self.sizes[cnd]]
+
+    def summary(self, cnd, channel=0):
+        # Median of every measure for the condition and channel (NaN while it has no rows)
+        with self.lock:
+            medians = self.medians[cnd].get(channel)
+            if medians is None:
+                return {m: np.nan for m in HRV_MEASURES}
+            return {m: medians[m].median() for m in HRV_MEASURES}
+
+    def to_dict(self):
+        # Layout of the former features_dict: {condition: {measure: 1-D array}}
+        out = {}
+        with self.lock:
+            for cnd in self.data:
+                rows = self.data[cnd][:self.sizes[cnd]]
+                out[cnd] = {m: rows[m].copy() for m in FEATURE_DTYPE.names}
+        return out
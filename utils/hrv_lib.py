@@ -0,0 +1,323 @@
+import collections
+import statistics
+import numpy as np
+
+# Streaming beat detection and HRV measures for the band-passed PPG signal (see lFilter).
+# Measures follow the heartpy definitions so the numbers stay comparable with earlier recordings:
+#   bpm = 60000 / mean(ibi), ibi = mean(ibi), sdnn = std(ibi), sdsd = std(|diff(ibi)|),
+#   rmssd = sqrt(mean(diff(ibi)^2)), pnn50 = fraction of |diff(ibi)| > 50 ms
+# with ibi in milliseconds and all standard deviations being population (ddof=0) ones.
+
+HRV_MEASURES = ['bpm', 'sdnn', 'sdsd', 'ibi', 'rmssd', 'pnn50']
+
+
+class streamingBeatDetector():
+    # Finds systolic peaks one block at a time. A local maximum is a candidate if it rises above a
+    # fraction of the running mean absolute amplitude and above peak_fraction of the median height
+    # of the recent beats; a candidate becomes a beat once no higher candidate follows within the
+    # refractory period, refractory_fraction of the median recent ibi (at least 60 / bpm_max s).
+    # Both adapt to the subject, so the diastolic (dicrotic) wave is not taken for a beat at resting
+    # heart rates. A candidate within the refractory period that is almost as high as the recent
+    # beats (strong_fraction) still counts as a beat, so a rising heart rate is followed; without a
+    # beat for forget_time seconds the detector falls back to the amplitude rule.
+    # Peak times are refined by parabolic interpolation, so IBIs are not quantised to the sampling period.
+    def __init__(self, sample_rate, bpm_max=180, threshold=0.5, amplitude_time=2.0, peak_fraction=0.5,
+                 refractory_fraction=0.6, strong_fraction=0.8, history=8, forget_time=3.0) -> None:
+        self.fs = sample_rate
+        self.min_refractory = int(round(self.fs * 60.0 / bpm_max))
+        self.threshold = threshold
+        self.peak_fraction = peak_fraction
+        self.refractory_fraction = refractory_fraction
+        self.strong_fraction = strong_fraction
+        self.history = history
+        self.forget = int(round(forget_time * self.fs))
+        alpha = 1.0 / (amplitude_time * self.fs)
+        self.amp_b = [alpha]
+        self.amp_a = [1.0, alpha - 1.0]
+        self.reset()
+
+    def reset(self):
+        self.amp_zi = None
+        self.tail = np.empty(0)     # last two samples of the previous block
+        self.n_seen = 0             # samples consumed so far (index of the next sample)
+        self.pending = None         # (index, refined time, value) of the current best candidate
+        self.last_beat_time = None
+        self.last_beat_index = None
+        self.peaks = collections.deque(maxlen=self.history)     # heights of the recent beats
+        self.intervals = collections.deque(maxlen=self.history) # recent ibis in samples
+        self.refractory = self.min_refractory
+        self.peak_height = np.inf   # median height of the recent beats
+        self.peak_level = -np.inf   # candidates must rise above it
+        return
+
+    def process(self, x):
+        # x: filtered samples; returns (beat times in seconds, ibis in ms) of the beats confirmed
+        # in this block. The first beat only sets the reference and yields no ibi.
+        from scipy.signal import lfilter     # imported on first use, see data_processing_lib
+        x = np.asarray(x, dtype=np.float64)
+        n = x.shape[0]
+        beat_times = []
+        if n == 0:
+            return np.empty(0), np.empty(0)
+        if self.amp_zi is None:
+            # start the amplitude estimate in steady state at the level of the first block
+            self.amp_zi = np.array([-self.amp_a[1] * np.mean(np.abs(x))])
+        amp, self.amp_zi = lfilter(self.amp_b, self.amp_a, np.abs(x), zi=self.amp_zi)
+
+        seg = np.concatenate((self.tail, x))
+        offset = self.n_seen - self.tail.shape[0]   # absolute index of seg[0]
+        if seg.shape[0] >= 3:
+            mid = seg[1:-1]
+            is_peak = (mid > seg[:-2]) & (mid >= seg[2:])
+            idx = np.nonzero(is_peak)[0] + 1
+            if idx.shape[0] > 0:
+                # amplitude estimate aligned with seg; tail samples reuse the first estimate of this block
+                amp_seg = np.concatenate((np.full(self.tail.shape[0], amp[0]), amp))
+                idx = idx[seg[idx] > self.threshold * amp_seg[idx]]
+            for i in idx:
+                if self.pending is not None and offset + i - self.pending[0] >= self.refractory:
+                    beat_times.append(self._confirm())
+                self._forget_stale(offset + i)
+                if seg[i] <= self.peak_level:
+                    continue
+                beat = self._candidate(offset + i, seg[i - 1], seg[i], seg[i + 1])
+                if beat is not None:
+                    beat_times.append(beat)
+
+        self.n_seen += n
+        self.tail = seg[-2:]
+        # Confirm the pending candidate once the refractory period after it has passed
+        if self.pending is not None and self.n_seen - 1 - self.pending[0] >= self.refractory:
+            beat_times.append(self._confirm())
+        self._forget_stale(self.n_seen - 1)
+
+        return self._ibis(beat_times)
+
+    def _candidate(self, index, y0, y1, y2):
+        # called for candidates in time order, after any pending candidate past its refractory period was confirmed
+        confirmed = None
+        if self.pending is not None:
+            if y1 > self.pending[2]:
+                self.pending = (index, self._refine(index, y0, y1, y2), y1)
+                return None
+            if index - self.pending[0] < self.min_refractory or y1 < self.strong_fraction * self.peak_height:
+                return None
+            confirmed = self._confirm()
+        self.pending = (index, self._refine(index, y0, y1, y2), y1)
+        return confirmed
+
+    def _refine(self, index, y0, y1, y2):
+        den = y0 - 2.0 * y1 + y2
+        shift = 0.5 * (y0 - y2) / den if den != 0 else 0.0
+        return (index + shift) / self.fs
+
+    def _confirm(self):
+        index, t, value = self.pending
+        self.pending = None
+        if self.last_beat_index is not None:
+            self.intervals.append(index - self.last_beat_index)
+            # statistics.median: a handful of values, much cheaper than np.median once per beat
+            self.refractory = max(self.min_refractory, int(self.refractory_fraction * statistics.median(self.intervals)))
+        self.last_beat_index = index
+        self.peaks.append(value)
+        self.peak_height = statistics.median(self.peaks)
+        self.peak_level = self.peak_fraction * self.peak_height
+        return t
+
+    def _forget_stale(self, index):
+        # Signal lost or changed: start over from the amplitude rule and the shortest refractory period
+        if self.last_beat_index is not None and self.pending is None and index - self.last_beat_index > self.forget:
+            self.last_beat_index = None
+            self.peaks.clear()
+            self.intervals.clear()
+            self.refractory = self.min_refractory
+            self.peak_height = np.inf
+            self.peak_level = -np.inf
+        return
+
+    def _ibis(self, beat_times):
+        times = []
+        ibis = []
+        for t in beat_times:
+            if self.last_beat_time is not None:
+                times.append(t)
+                ibis.append((t - self.last_beat_time) * 1000.0)
+            self.last_beat_time = t
+        return np.array(times), np.array(ibis)
+
+
+class runningHRV():
+    # HRV measures over a sliding window of beats (window in seconds, None for the whole session),
+    # updated in O(new beats) from running sums. IBIs outside [ibi_min, ibi_max] ms are rejected
+    # and break the chain of successive differences.
+    def __init__(self, window=20.0, ibi_min=333.0, ibi_max=1500.0) -> None:
+        self.window = window
+        self.ibi_min = ibi_min
+        self.ibi_max = ibi_max
+        self.reset()
+
+    def reset(self):
+        self.beats = collections.deque()    # [beat time, ibi, successive difference or None]
+        self.n = 0
+        self.sum_ibi = 0.0
+        self.sumsq_ibi = 0.0
+        self.n_diff = 0
+        self.sum_absdiff = 0.0
+        self.sumsq_diff = 0.0
+        self.n_nn50 = 0
+        self.chain_broken = True
+        self.total_beats = 0
+        self.rejected = 0
+        return
+
+    def add(self, times, ibis):
+        for t, ibi in zip(times, ibis):
+            if ibi < self.ibi_min or ibi > self.ibi_max:
+                self.rejected += 1
+                self.chain_broken = True
+                continue
+            diff = None
+            if not self.chain_broken and len(self.beats) > 0:
+                diff = ibi - self.beats[-1][1]
+                self._add_diff(diff, 1)
+            self.beats.append([t, ibi, diff])
+            self.n += 1
+            self.sum_ibi += ibi
+            self.sumsq_ibi += ibi * ibi
+            self.chain_broken = False
+            self.total_beats += 1
+            if self.window is not None:
+                while self.beats[-1][0] - self.beats[0][0] > self.window:
+                    self._pop_oldest()
+        return
+
+    def gap(self):
+        # Beats were left out (e.g. an unusable stretch of signal): the next ibi starts a new chain
+        self.chain_broken = True
+        return
+
+    def _add_diff(self, diff, sign):
+        self.n_diff += sign
+        self.sum_absdiff += sign * abs(diff)
+        self.sumsq_diff += sign * diff * diff
+        if abs(diff) > 50.0:
+            self.n_nn50 += sign
+        return
+
+    def _pop_oldest(self):
+        t, ibi, diff = self.beats.popleft()
+        self.n -= 1
+        self.sum_ibi -= ibi
+        self.sumsq_ibi -= ibi * ibi
+        if diff is not None:
+            self._add_diff(diff, -1)
+        if len(self.beats) > 0 and self.beats[0][2] is not None:
+            # The next beat's difference referred to the beat just removed
+            self._add_diff(self.beats[0][2], -1)
+            self.beats[0][2] = None
+        return
+
+    def measures(self):
+        # Returns a dict with HRV_MEASURES, or None until there are enough beats
+        if self.n < 2 or self.n_diff < 1:
+            return None
+        mean_ibi = self.sum_ibi / self.n
+        mean_absdiff = self.sum_absdiff / self.n_diff
+        return {
+            'bpm': 60000.0 / mean_ibi,
+            'ibi': mean_ibi,
+            'sdnn': np.sqrt(max(self.sumsq_ibi / self.n - mean_ibi * mean_ibi, 0.0)),
+            'sdsd': np.sqrt(max(self.sumsq_diff / self.n_diff - mean_absdiff * mean_absdiff, 0.0)),
+            'rmssd': np.sqrt(self.sumsq_diff / self.n_diff),
+            'pnn50': self.n_nn50 / self.n_diff,
+        }
+
+
+def streaming_window_features(filtered, fs, window=20.0, step=5.0, raw=None, quality=None):
+    # Replays the live pipeline over a filtered recording: beats are detected block by block and
+    # the measures over the last `window` seconds are taken every `step` seconds.
+    # With the raw recording and a quality.signalQuality, the beats of unusable steps are left out
+    # like in the live view.
+    # Returns (window end times in seconds, {measure: array}); windows without enough beats are left out.
+    detector = streamingBeatDetector(fs)
+    hrv = runningHRV(window=window)
+    n_step = int(round(step * fs))
+    ends = []
+    rows = []
+    for start in range(0, filtered.shape[0] - n_step + 1, n_step):
+        block = filtered[start:start + n_step]
+        beat_times, ibis = detector.process(block)
+        if quality is not None and not quality.assess(raw[start:start + n_step], block)['usable']:
+            hrv.gap()
+            continue
+        hrv.add(beat_times, ibis)
+        m = hrv.measures()
+        if m is not None:
+            ends.append((start + n_step) / fs)
+            rows.append(m)
+    return np.array(ends), {k: np.array([r[k] for r in rows]) for k in HRV_MEASURES}
+
+
+def sliding_window_features(filtered, fs, window=20.0, step=5.0, raw=None, quality=None):
+    # Same measures as streaming_window_features for all windows of a recording at once: beats are
+    # detected in a single pass, and the sums behind every measure come from cumulative sums over
+    # the ibi series, so each window costs two searchsorted lookups. A window ending at time e
+    # covers the beats in (e - window, e]; a successive difference counts if both of its beats do.
+    # IBIs outside [ibi_min, ibi_max] of runningHRV are left out and break the chain of differences.
+    # With the raw recording and a quality.signalQuality, beats of unusable steps are left out
+    # (the chain breaks there too) and windows ending in an unusable step are skipped.
+    # Returns (window end times in seconds, {measure: array}); windows without enough beats are left out.
+    n_step = int(round(step * fs))
+    n_steps = filtered.shape[0] // n_step
+    if n_steps == 0:
+        return np.empty(0), {k: np.empty(0) for k in HRV_MEASURES}
+    ends = np.arange(1, n_steps + 1) * n_step / fs
+    beat_times, ibis = streamingBeatDetector(fs).process(filtered)
+    limits = runningHRV()
+    valid = (ibis >= limits.ibi_min) & (ibis <= limits.ibi_max)
+    # Chain breaks: rejected ibis and, with quality, unusable steps (even those without beats)
+    breaks = np.cumsum(~valid)
+    if quality is not None:
+        # One quality "channel" per step: (n_step, n_steps) blocks judged in a single call
+        usable = quality.assess(raw[:n_steps * n_step].reshape(n_steps, n_step).T,
+                                filtered[:n_steps * n_step].reshape(n_steps, n_step).T)['usable']
+        beat_step = np.minimum((beat_times * fs).astype(np.int64) // n_step, n_steps - 1)
+        valid &= usable[beat_step]
+        bad_before = np.concatenate(([0], np.cumsum(~usable)))[beat_step + 1]
+        breaks = np.cumsum(~valid) + bad_before
+        ends = ends[usable]
+
+    # diff[i] = ibis[i] - ibis[i - 1], valid if both ibis are and no break lies in between
+    diff = np.diff(ibis, prepend=np.nan)
+    diff_valid = valid & np.concatenate(([False], valid[:-1])) & (breaks == np.concatenate(([0], breaks[:-1])))
+    # ibis around a reference value, so the sums of squares do not lose precision over long recordings
+    ref = np.median(ibis[valid]) if valid.any() else 0.0
+    x = np.where(valid, ibis - ref, 0.0)
+    d = np.where(diff_valid, diff, 0.0)
+
+    def csum(v):
+        return np.concatenate(([0.0], np.cumsum(v)))
+
+    c_n, c_ibi, c_ibi2 = csum(valid), csum(x), csum(x * x)
+    c_nd, c_abs, c_d2, c_nn50 = csum(diff_valid), csum(np.abs(d)), csum(d * d), csum(np.abs(d) > 50.0)
+    hi = np.searchsorted(beat_times, ends, side='right')
+    lo = np.searchsorted(beat_times, ends - window, side='right')
+    lo_d = np.minimum(lo + 1, hi)   # the first beat's difference refers to a beat outside the window
+    n = c_n[hi] - c_n[lo]
+    n_diff = c_nd[hi] - c_nd[lo_d]
+    keep = (n >= 2) & (n_diff >= 1)
+    n, n_diff, hi, lo, lo_d = n[keep], n_diff[keep], hi[keep], lo[keep], lo_d[keep]
+
+    mean_x = (c_ibi[hi] - c_ibi[lo]) / n
+    mean_ibi = ref + mean_x
+    mean_absdiff = (c_abs[hi] - c_abs[lo_d]) / n_diff
+    mean_d2 = (c_d2[hi] - c_d2[lo_d]) / n_diff
+    measures = {
+        'bpm': 60000.0 / mean_ibi,
+        'sdnn': np.sqrt(np.maximum((c_ibi2[hi] - c_ibi2[lo]) / n - mean_x * mean_x, 0.0)),
+        'sdsd': np.sqrt(np.maximum(mean_d2 - mean_absdiff * mean_absdiff, 0.0)),
+        'ibi': mean_ibi,
+        'rmssd': np.sqrt(mean_d2),
+        'pnn50': (c_nn50[hi] - c_nn50[lo_d]) / n_diff,
+    }
+    return ends[keep], measures
@@ -0,0 +1,143 @@
+import collections
+import json
+import os
+import threading
+import time
+import numpy as np
+
+# Instrumentation of the acquisition pipeline, cheap enough to stay on during long studies:
+#   counters   totals since start (samples received, read errors, ...); rates per second are
+#              derived from two snapshots with counter_rates()
+#   gauges     current values (queue depth, display fps, ...), set directly or polled from
+#              collectors (callables returning {name: value}) when a snapshot is taken
+#   timings    durations of pipeline stages; snapshots give count and sum since start and the
+#              mean / p95 / max of the most recent calls
+# Counters and timings are updated from the acquisition, Qt and worker threads.
+
+PROMETHEUS_PREFIX = 'physcomp_'
+
+
+class pipelineMetrics():
+    def __init__(self, recent=256) -> None:
+        self.lock = threading.Lock()
+        self.recent = recent
+        self.counters = {}
+        self.gauges = {}
+        self.timings = {}       # name -> [count, total seconds, deque of recent durations]
+        self.collectors = []
+        self.started = time.monotonic()
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+        return
+
+    def set(self, name, value):
+        self.gauges[name] = value
+        return
+
+    def observe(self, name, seconds):
+        with self.lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = [0, 0.0, collections.deque(maxlen=self.recent)]
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2].append(seconds)
+        return
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+        return
+
+    def snapshot(self):
+        gauges = dict(self.gauges)
+        for collector in self.collectors:
+            gauges.update(collector())
+        with self.lock:
+            counters = dict(self.counters)
+            timings = {name: (t[0], t[1], np.array(t[2])) for name, t in self.timings.items()}
+        return {
+            'time': time.time(),
+            'uptime': time.monotonic() - self.started,
+            'counters': counters,
+            'gauges': gauges,
+            'timings': {name: {'count': count, 'sum': total,
+                               'mean_ms': 1e3 * float(recent.mean()), 'p95_ms': 1e3 * float(np.percentile(recent, 95)),
+                               'max_ms': 1e3 * float(recent.max())}
+                        for name, (count, total, recent) in timings.items()},
+        }
+
+
+def counter_rates(previous, current):
+    # Per-second increase of every counter between two snapshots
+    dt = current['uptime'] - previous['uptime'] if previous is not None else current['uptime']
+    if dt <= 0:
+        return {}
+    before = previous['counters'] if previous is not None else {}
+    return {name: (value - before.get(name, 0)) / dt for name, value in current['counters'].items()}
+
+
+def prometheus_text(snapshot):
+    # Prometheus text exposition format, e.g. for the node_exporter textfile collector
+    lines = []
+    for name, value in sorted(snapshot['counters'].items()):
+        metric = PROMETHEUS_PREFIX + name + '_total'
+        lines += ['# TYPE ' + metric + ' counter', metric + ' ' + repr(float(value))]
+    for name, value in sorted(snapshot['gauges'].items()):
+        metric = PROMETHEUS_PREFIX + name
+        lines += ['# TYPE ' + metric + ' gauge', metric + ' ' + repr(float(value))]
+    for name, t in sorted(snapshot['timings'].items()):
+        metric = PROMETHEUS_PREFIX + name + '_seconds'
+        lines += ['# TYPE ' + metric + ' summary',
+                  metric + '{quantile="0.95"} ' + repr(t['p95_ms'] * 1e-3),
+                  metric + '_sum ' + repr(float(t['sum'])),
+                  metric + '_count ' + str(t['count'])]
+    return '\n'.join(lines) + '\n'
+
+
+# Writes a snapshot every `interval` seconds from a background thread: a '.prom' path is
+# replaced atomically with the Prometheus text format, any other path gets one JSON object per
+# line appended (snapshot plus the counter rates over the interval).
+class metricsExporter():
+    def __init__(self, metrics, path, interval=10.0) -> None:
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.prometheus = path.endswith('.prom')
+        self.previous = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(name='metricsExporter', target=self._run, daemon=True)
+        self.thread.start()
+        return
+
+    def stop(self):
+        # Writes a last snapshot, so short runs are covered too
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.write()
+        return
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.write()
+        return
+
+    def write(self):
+        snapshot = self.metrics.snapshot()
+        if self.prometheus:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(prometheus_text(snapshot))
+            os.replace(tmp_path, self.path)
+        else:
+            snapshot['rates'] = counter_rates(self.previous, snapshot)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(snapshot) + '\n')
+        self.previous = snapshot
+        return
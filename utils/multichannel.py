@@ -0,0 +1,186 @@
+import logging
+import numpy as np
+
+from utils.data_processing_lib import lFilter, PPG_LOWCUT, PPG_HIGHCUT, PPG_FILTER_ORDER
+from utils.hrv_lib import HRV_MEASURES, streamingBeatDetector, runningHRV
+from utils.quality import signalQuality
+from utils.timing import streamResampler
+
+logger = logging.getLogger(__name__)
+
+# Acquisition from several sensors at once: channels of one board arrive together (binary frames
+# or comma-separated lines), boards on different ports are read by one devices.deviceReader each
+# and put on the shared clock (devices.sharedClock). groupAligner resamples every board onto one
+# sample grid and merges them into a single (n_samples, n_channels) stream, which channelBank
+# filters and analyses with one filter call per block for all channels.
+
+
+# A board that stops delivering must not hold up the others: once it lags more than `timeout`
+# seconds behind the most advanced board its columns are filled with NaN (and its data for those
+# grid points is dropped should it come back), and a board that has not sent anything `timeout`
+# seconds after the first data of the others is left out of the group. Either way a warning is
+# logged, and no board's buffer holds more than about `timeout` seconds.
+class groupAligner():
+    def __init__(self, fs, device_ids, timeout=2.0) -> None:
+        self.fs = fs
+        self.device_ids = list(device_ids)
+        self.timeout = timeout
+        self.reset()
+
+    def reset(self):
+        self.first_blocks = {}      # device id -> blocks received before every device was seen
+        self.resamplers = None
+        self.pending = {d: [] for d in self.device_ids}     # resampled blocks not merged yet
+        self.n_channels = {}
+        self.skip = {d: 0 for d in self.device_ids}         # grid points already filled with NaN
+        self.missing = set()
+        self.t_start = None
+        self.n_out = 0
+        return
+
+    def add(self, device_id, samples, t):
+        # samples: (n_samples, n_channels) of one device, t: their times on the shared clock.
+        # Returns (grid times, merged samples) of the grid points all devices have covered, with
+        # the channels in device order, or None.
+        if device_id not in self.device_ids:
+            return None     # left out of the group
+        self.n_channels[device_id] = samples.shape[1]
+        if self.resamplers is None:
+            self.first_blocks.setdefault(device_id, []).append((samples, t))
+            if len(self.first_blocks) < len(self.device_ids):
+                if t[-1] - min(blocks[0][1][0] for blocks in self.first_blocks.values()) <= self.timeout:
+                    return None
+                for d in self.device_ids:
+                    if d not in self.first_blocks:
+                        logger.warning('Device %s sent no data within %.1f s, left out of the group', d, self.timeout)
+                self.device_ids = [d for d in self.device_ids if d in self.first_blocks]
+            # The grid starts once every device has delivered data
+            self.t_start = max(blocks[0][1][0] for blocks in self.first_blocks.values())
+            self.resamplers = {d: streamResampler(self.fs, grid_start=self.t_start) for d in self.device_ids}
+            for d, blocks in self.first_blocks.items():
+                for x, tx in blocks:
+                    self._append(d, self.resamplers[d].process(x, tx))
+            self.first_blocks = {}
+        else:
+            self._append(device_id, self.resamplers[device_id].process(samples, t))
+
+        available = {d: sum(b.shape[0] for b in self.pending[d]) for d in self.device_ids}
+        most = max(available.values())
+        for d in self.device_ids:
+            if d not in self.missing and most - available[d] > self.timeout * self.fs:
+                self.missing.add(d)
+                logger.warning('Device %s stopped delivering data, its channels are NaN until it resumes', d)
+            if d in self.missing and available[d] < most:
+                fill = most - available[d]
+                self.pending[d].append(np.full((fill, self.n_channels[d]), np.nan))
+                self.skip[d] += fill
+                available[d] = most
+        n = min(available.values())
+        if n == 0:
+            return None
+        merged = np.empty((n, sum(self.n_channels[d] for d in self.device_ids)))
+        col = 0
+        for d in self.device_ids:
+            x = np.concatenate(self.pending[d]) if len(self.pending[d]) > 1 else self.pending[d][0]
+            merged[:, col:col + x.shape[1]] = x[:n]
+            col += x.shape[1]
+            self.pending[d] = [x[n:]] if x.shape[0] > n else []
+        t_grid = self.t_start + (self.n_out + np.arange(n)) / self.fs
+        self.n_out += n
+        return t_grid, merged
+
+    def _append(self, device_id, x):
+        # Resampled samples of grid points that were filled with NaN while the device was missing are dropped
+        drop = min(self.skip[device_id], x.shape[0])
+        self.skip[device_id] -= drop
+        x = x[drop:]
+        if x.shape[0] == 0:
+            return
+        if device_id in self.missing:
+            self.missing.discard(device_id)
+            logger.warning('Device %s delivers data again', device_id)
+        self.pending[device_id].append(x)
+        return
+
+
+def hold_missing(x, last=None):
+    # NaN samples (a board that stopped delivering, see groupAligner) replaced by the last valid
+    # sample of their channel, so filter and beat detector states stay finite; the held stretch is
+    # flat and fails the quality check. last: (n_channels,) last valid samples of the previous
+    # block (NaN if none). Returns (filled x, last valid samples of this block).
+    x = np.asarray(x, dtype=np.float64)
+    n, n_ch = x.shape
+    last = np.full(n_ch, np.nan) if last is None else last
+    valid = ~np.isnan(x)
+    # index of the latest valid sample at or before every position, -1 if none in this block
+    idx = np.maximum.accumulate(np.where(valid, np.arange(n)[:, np.newaxis], -1), axis=0)
+    filled = np.where(idx >= 0, x[np.maximum(idx, 0), np.arange(n_ch)], last)
+    filled = np.where(np.isnan(filled), 0.0, filled)
+    return filled, filled[-1] if n > 0 else last
+
+
+# Filtering, beat detection and HRV measures for n_channels channels. The band-pass runs on the
+# whole (n_samples, n_channels) block at once; beats are confirmed per channel, as the refractory
+# logic is sequential, but that only touches the few peak candidates of each block. Beats enter
+# the HRV measures when measures() is called and the signal quality of their channel since the
+# last call was usable.
+class channelBank():
+    def __init__(self, sample_rate, n_channels, window=20.0) -> None:
+        self.fs = sample_rate
+        self.n_channels = n_channels
+        self.filtObj = lFilter(PPG_LOWCUT, PPG_HIGHCUT, sample_rate, order=PPG_FILTER_ORDER)
+        self.beat_detectors = [streamingBeatDetector(sample_rate) for ch in range(n_channels)]
+        self.hrv = [runningHRV(window=window) for ch in range(n_channels)]
+        self.quality = signalQuality()
+        self.window_beats = [[] for ch in range(n_channels)]
+        self.usable = np.ones(n_channels, dtype=bool)     # quality of the last measure window
+        self.last_valid = None
+
+    def process(self, x):
+        # x: raw (n_samples, n_channels), NaN where a board delivered nothing; returns the filtered
+        # block, NaN at the same places
+        missing = np.isnan(x)
+        if missing.any() or self.last_valid is None:
+            x, self.last_valid = hold_missing(x, self.last_valid)
+        elif x.shape[0] > 0:
+            self.last_valid = x[-1].astype(np.float64)
+        filtered = self.filtObj.process_block(x)
+        self.quality.process(x, filtered)
+        for ch in range(self.n_channels):
+            beat_times, ibis = self.beat_detectors[ch].process(filtered[:, ch])
+            if ibis.shape[0] > 0:
+                self.window_beats[ch].append((beat_times, ibis))
+        if missing.any():
+            filtered[missing] = np.nan
+        return filtered
+
+    def measures(self):
+        # (n_channels, len(HRV_MEASURES)); rows of channels without enough beats or with an
+        # unusable signal since the last call are NaN
+        q = self.quality.close_window()
+        if q is not None:
+            self.usable = q['usable']
+        out = np.full((self.n_channels, len(HRV_MEASURES)), np.nan)
+        for ch in range(self.n_channels):
+            if not self.usable[ch]:
+                self.hrv[ch].gap()
+                self.window_beats[ch] = []
+                continue
+            for beat_times, ibis in self.window_beats[ch]:
+                self.hrv[ch].add(beat_times, ibis)
+            self.window_beats[ch] = []
+            m = self.hrv[ch].measures()
+            if m is not None:
+                out[ch] = [m[k] for k in HRV_MEASURES]
+        return out
+
+    def reset(self):
+        self.filtObj.reset()
+        self.quality.reset()
+        self.usable[:] = True
+        self.last_valid = None
+        for ch in range(self.n_channels):
+            self.beat_detectors[ch].reset()
+            self.hrv[ch].reset()
+            self.window_beats[ch] = []
+        return
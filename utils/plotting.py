@@ -0,0 +1,20 @@
+import numpy as np
+
+# Helpers for drawing long signals into a fixed number of pixels.
+
+
+def minmax_decimate(y, n_columns):
+    # Reduces y to at most two points per pixel column, the minimum and the maximum of the samples
+    # falling into it, so the drawn polyline covers exactly the vertical extent of the full signal
+    # in every column (peaks are never lost, unlike plain subsampling).
+    # Returns (x in column units 0 .. n_columns - 1, y)
+    n = y.shape[0]
+    if n == 0:
+        return np.empty(0), np.empty(0)
+    if n <= 2 * n_columns:
+        return np.arange(n) * ((n_columns - 1) / max(n - 1, 1)), y
+    starts = (np.arange(n_columns) * n) // n_columns
+    out = np.empty(2 * n_columns)
+    out[0::2] = np.minimum.reduceat(y, starts)
+    out[1::2] = np.maximum.reduceat(y, starts)
+    return np.repeat(np.arange(n_columns, dtype=np.float64), 2), out
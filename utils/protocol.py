@@ -0,0 +1,141 @@
+import numpy as np
+
+# Binary framed serial protocol (see arduino/PulseSensor/PulseSensor.ino)
+#
+#   offset  size       field
+#   0       2          sync bytes 0xA5 0x5A
+#   2       1          n_channels
+#   3       2          sequence counter (uint16, little-endian, wraps)
+#   5       4          device timestamp in microseconds (uint32, little-endian, wraps)
+#   9       2*n_ch     samples (uint16, little-endian)
+#   9+2*n   1          checksum: sum of bytes 2 .. 8+2*n_ch, modulo 256
+#
+# The host asks for binary frames by sending CMD_BINARY; boards running the plain ASCII
+# sketch ignore it and keep printing one value per line.
+
+SYNC = b'\xa5\x5a'
+CMD_BINARY = b'B'
+CMD_ASCII = b'A'
+MAX_CHANNELS = 16
+HEADER_LEN = 9
+
+
+def frame_len(n_channels):
+    return HEADER_LEN + 2 * n_channels + 1
+
+
+def frame_dtype(n_channels):
+    return np.dtype([('sync', '<u2'), ('n_channels', 'u1'), ('seq', '<u2'), ('t_us', '<u4'),
+                     ('samples', '<u2', (n_channels,)), ('checksum', 'u1')])
+
+
+def encode_frames(seq, t_us, samples):
+    # Host-side encoder, mirrors the firmware; used by simulators and tests of the decoder
+    samples = np.asarray(samples)
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    n, n_ch = samples.shape
+    frames = np.zeros(n, dtype=frame_dtype(n_ch))
+    frames['sync'] = 0x5aa5
+    frames['n_channels'] = n_ch
+    frames['seq'] = np.asarray(seq) & 0xffff
+    frames['t_us'] = np.asarray(t_us) & 0xffffffff
+    frames['samples'] = samples
+    raw = frames.view(np.uint8).reshape(n, frame_len(n_ch))
+    frames['checksum'] = raw[:, 2:-1].sum(axis=1, dtype=np.uint32) & 0xff
+    return frames.tobytes()
+
+
+class binaryFrameDecoder():
+    def __init__(self) -> None:
+        self.pending = b''          # bytes of an incomplete frame carried over to the next call
+        self.last_seq = None        # unwrapped sequence number of the last decoded frame
+        self.last_t_us = None       # unwrapped device timestamp of the last decoded frame
+        self.n_channels = None
+        self.frames = 0
+        self.dropped_samples = 0    # frames missing according to sequence gaps
+        self.bad_frames = 0         # checksum / header mismatches
+        self.skipped_bytes = 0      # bytes discarded while searching for sync
+
+    def decode(self, data):
+        # Returns (samples, t_us): samples as float64 (n_frames, n_channels) and device timestamps
+        # in microseconds (int64, unwrapped). Whole runs of frames are decoded with np.frombuffer.
+        buf = self.pending + data
+        samples_list = []
+        t_list = []
+        pos = 0
+        while True:
+            k = buf.find(SYNC, pos)
+            if k < 0:
+                keep = len(buf) - 1 if buf.endswith(SYNC[:1]) else len(buf)
+                self.skipped_bytes += keep - pos
+                pos = keep
+                break
+            self.skipped_bytes += k - pos
+            if len(buf) - k < 3:
+                pos = k
+                break
+            n_ch = buf[k + 2]
+            if n_ch == 0 or n_ch > MAX_CHANNELS:
+                self.bad_frames += 1
+                pos = k + 1
+                continue
+            flen = frame_len(n_ch)
+            n_frames = (len(buf) - k) // flen
+            if n_frames == 0:
+                pos = k
+                break
+
+            raw = np.frombuffer(buf, dtype=np.uint8, count=n_frames * flen, offset=k).reshape(n_frames, flen)
+            ok = ((raw[:, 0] == 0xa5) & (raw[:, 1] == 0x5a) & (raw[:, 2] == n_ch) &
+                  ((raw[:, 2:-1].sum(axis=1, dtype=np.uint32) & 0xff) == raw[:, -1]))
+            n_good = n_frames if ok.all() else int(np.argmin(ok))
+            if n_good == 0:
+                self.bad_frames += 1
+                pos = k + 1
+                continue
+
+            frames = np.frombuffer(buf, dtype=frame_dtype(n_ch), count=n_good, offset=k)
+            if self.n_channels is not None and n_ch != self.n_channels:
+                # Channel layout changed (board re-flashed / reset): restart the counters
+                self.last_seq = None
+                self.last_t_us = None
+            self.n_channels = n_ch
+            samples_list.append(frames['samples'].astype(np.float64))
+            t_list.append(self._unwrap_frames(frames))
+            self.frames += n_good
+            pos = k + n_good * flen
+
+        self.pending = buf[pos:]
+        if len(samples_list) == 0:
+            n_ch = self.n_channels if self.n_channels is not None else 1
+            return np.empty((0, n_ch)), np.empty(0, dtype=np.int64)
+        if len(samples_list) == 1:
+            return samples_list[0], t_list[0]
+        if len(set(s.shape[1] for s in samples_list)) > 1:
+            return samples_list[-1], t_list[-1]
+        return np.concatenate(samples_list), np.concatenate(t_list)
+
+    def _unwrap_frames(self, frames):
+        seq = self._unwrap(frames['seq'].astype(np.int64), self.last_seq, 1 << 16)
+        t_us = self._unwrap(frames['t_us'].astype(np.int64), self.last_t_us, 1 << 32)
+        if self.last_seq is not None:
+            gaps = np.diff(np.concatenate(([self.last_seq], seq))) - 1
+        else:
+            gaps = np.diff(seq) - 1
+        self.dropped_samples += int(gaps[gaps > 0].sum())
+        self.last_seq = int(seq[-1])
+        self.last_t_us = int(t_us[-1])
+        return t_us
+
+    @staticmethod
+    def _unwrap(values, last, period):
+        # Counters wrap around; make them monotonic, continuing from the previous block
+        prev = values[0] if last is None else last
+        steps = np.diff(np.concatenate(([prev % period], values)))
+        steps[steps < 0] += period
+        return prev + np.cumsum(steps)
+
+    def reset(self):
+        self.__init__()
+        return
@@ -0,0 +1,75 @@
+import numpy as np
+
+# Signal quality of the PPG stream, accumulated block by block and judged once per feature window,
+# so beats from windows where the sensor is detached, saturated or swamped by noise never reach
+# the HRV measures. Per window:
+#   clipped     fraction of raw samples at the ends of the ADC range (0 .. 1023 for the PulseSensor)
+#   range       peak-to-peak of the raw samples; a flat line means no sensor or no contact
+#   band_ratio  power of the band-passed signal (PPG_LOWCUT .. PPG_HIGHCUT, see lFilter) relative
+#               to the power of the raw signal around its mean; low when motion or noise dominates
+# The raw and the filtered block are both at hand in the acquisition path, so this costs a few
+# reductions per block. Blocks may be (n_samples,) or (n_samples, n_channels); the results then
+# have one entry per channel.
+
+QUALITY_REASONS = ['clipped', 'flat', 'noisy']
+
+
+class signalQuality():
+    def __init__(self, adc_min=0.0, adc_max=1023.0, max_clipped=0.05, min_range=5.0, min_band_ratio=0.3) -> None:
+        self.adc_min = adc_min
+        self.adc_max = adc_max
+        self.max_clipped = max_clipped
+        self.min_range = min_range
+        self.min_band_ratio = min_band_ratio
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.ref = 0.0
+        self.n_clipped = 0
+        self.raw_min = np.inf
+        self.raw_max = -np.inf
+        self.raw_sum = 0.0
+        self.raw_sumsq = 0.0
+        self.filt_sumsq = 0.0
+        return
+
+    def process(self, raw, filtered):
+        # raw: samples as read from the ADC, filtered: the same samples after the band-pass
+        if raw.shape[0] == 0:
+            return
+        # Accumulated around the first sample of the window, which keeps the sums small
+        if self.n == 0:
+            self.ref = raw[0].copy() if raw.ndim > 1 else raw[0]
+        d = raw - self.ref
+        self.n += raw.shape[0]
+        self.n_clipped = self.n_clipped + np.count_nonzero((raw <= self.adc_min) | (raw >= self.adc_max), axis=0)
+        self.raw_min = np.minimum(self.raw_min, raw.min(axis=0))
+        self.raw_max = np.maximum(self.raw_max, raw.max(axis=0))
+        self.raw_sum = self.raw_sum + d.sum(axis=0)
+        self.raw_sumsq = self.raw_sumsq + np.einsum('i...,i...->...', d, d)
+        self.filt_sumsq = self.filt_sumsq + np.einsum('i...,i...->...', filtered, filtered)
+        return
+
+    def close_window(self):
+        # Judges the samples since the last call and starts a new window. Returns a dict with the
+        # three indices, 'usable' and 'reason' (the first failed check in QUALITY_REASONS order,
+        # '' if usable); None if no samples arrived.
+        if self.n == 0:
+            return None
+        clipped = self.n_clipped / self.n
+        peak_to_peak = self.raw_max - self.raw_min
+        raw_var = self.raw_sumsq / self.n - (self.raw_sum / self.n) ** 2
+        band_ratio = (self.filt_sumsq / self.n) / np.maximum(raw_var, 1e-12)
+        failed = [clipped > self.max_clipped, peak_to_peak < self.min_range, band_ratio < self.min_band_ratio]
+        reason = np.select(failed, QUALITY_REASONS, '')
+        q = {'clipped': clipped, 'range': peak_to_peak, 'band_ratio': band_ratio,
+             'usable': reason == '', 'reason': reason if reason.ndim > 0 else str(reason)}
+        self.reset()
+        return q
+
+    def assess(self, raw, filtered):
+        # Quality of one complete window, e.g. a stretch of a saved recording
+        self.reset()
+        self.process(raw, filtered)
+        return self.close_window()
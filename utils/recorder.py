@@ -0,0 +1,135 @@
+import json
+import os
+import queue
+import threading
+import time
+import numpy as np
+
+# Streams a recording to disk while it is being acquired.
+# Samples go to a standard .npy file that is appended to in fixed-size chunks by a background
+# writer thread; the header is written with a fixed size and rewritten with the current sample
+# count at every fsync, so the file can be opened with np.load(path, mmap_mode='r') at any time
+# and a crash loses at most the last fsync_interval seconds. A JSON sidecar (same name, .json)
+# holds the metadata and the sample count. on_sync(n_samples), if given, is called from the writer
+# thread after every fsync with the number of samples that are safely on disk. If the writer
+# thread fails, the error is kept and raised by the next write() or close().
+
+HEADER_SIZE = 128   # bytes, multiple of 64 as required by the .npy format
+
+
+def npy_header(dtype, shape):
+    header = {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False, 'shape': shape}
+    text = repr(header).encode('latin1')
+    pad = HEADER_SIZE - 10 - len(text) - 1
+    if pad < 0:
+        raise ValueError('npy header does not fit in ' + str(HEADER_SIZE) + ' bytes')
+    return b'\x93NUMPY\x01\x00' + np.uint16(HEADER_SIZE - 10).tobytes() + text + b' ' * pad + b'\n'
+
+
+def sidecar_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+class streamingRecorder():
+    def __init__(self, path, dtype=np.float32, n_channels=None, metadata=None,
+                 chunk_size=4096, fsync_interval=5.0, on_sync=None) -> None:
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.n_channels = n_channels
+        self.metadata = dict(metadata) if metadata is not None else {}
+        self.chunk_size = chunk_size            # samples per write
+        self.fsync_interval = fsync_interval    # seconds
+        self.on_sync = on_sync
+        self.n_samples = 0                      # samples written to the file so far
+        self.queue = queue.Queue()
+        self.error = None                       # exception that stopped the writer thread
+        self.file = open(self.path, 'wb')
+        self.file.write(npy_header(self.dtype, self._shape()))
+        self._write_sidecar()
+        self.writer = threading.Thread(name='recorder', target=self._writer_loop, daemon=True)
+        self.writer.start()
+
+    def write(self, values):
+        # Non-blocking; called from the acquisition path
+        self._raise_error()
+        self.queue.put(np.asarray(values, dtype=self.dtype))
+        return
+
+    def close(self):
+        # Flushes everything queued so far and finalises header and sidecar
+        self.queue.put(None)
+        self.writer.join()
+        self._raise_error()
+        return self.path
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise RuntimeError('recorder for ' + self.path + ' failed') from self.error
+        return
+
+    def _shape(self):
+        if self.n_channels is None:
+            return (self.n_samples,)
+        return (self.n_samples, self.n_channels)
+
+    def _writer_loop(self):
+        try:
+            self._write_blocks()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.file.close()
+        return
+
+    def _write_blocks(self):
+        pending = []
+        n_pending = 0
+        last_sync = time.monotonic()
+        done = False
+        while not done:
+            try:
+                block = self.queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                block = False   # nothing arrived: only the sync may be due
+            if block is None:
+                done = True
+            elif block is not False:
+                pending.append(block)
+                n_pending += block.shape[0]
+
+            sync_due = done or (time.monotonic() - last_sync) >= self.fsync_interval
+            if n_pending >= self.chunk_size or (sync_due and n_pending > 0):
+                chunk = np.concatenate(pending)
+                self.file.write(chunk.tobytes())
+                self.n_samples += chunk.shape[0]
+                pending = []
+                n_pending = 0
+            if sync_due:
+                self._sync()
+                last_sync = time.monotonic()
+        return
+
+    def _sync(self):
+        # Publish the samples written so far: header, data and sidecar all agree after this
+        self.file.flush()
+        end = self.file.tell()
+        self.file.seek(0)
+        self.file.write(npy_header(self.dtype, self._shape()))
+        self.file.seek(end)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._write_sidecar()
+        if self.on_sync is not None:
+            self.on_sync(self.n_samples)
+        return
+
+    def _write_sidecar(self):
+        info = dict(self.metadata)
+        info['dtype'] = self.dtype.str
+        info['n_samples'] = self.n_samples
+        info['n_channels'] = 1 if self.n_channels is None else self.n_channels
+        tmp = sidecar_path(self.path) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(info, f, indent=2)
+        os.replace(tmp, sidecar_path(self.path))
+        return
@@ -0,0 +1,90 @@
+import collections
+import threading
+import time
+
+from utils.feature_store import featureStore
+
+
+# State of one acquisition session, shared by the serial thread, the Qt thread and the feature /
+# plotting workers. Flags are threading.Events; the recorder and the feature store are swapped
+# atomically under a lock, so stopping a recording hands the recorder over without losing samples
+# that arrive at the same moment or carrying them into the next recording.
+class AcquisitionSession():
+    def __init__(self, conditions=()) -> None:
+        self.lock = threading.Lock()
+        self.acquiring = threading.Event()
+        self.recording = threading.Event()
+        self.features_updated = threading.Event()      # bar plot must be refreshed
+        self.features_reset = threading.Event()        # bar plot must be re-initialised
+        self.recorder = None    # streamingRecorder of the current recording
+        self.incoming = collections.deque()     # (samples, t_us, arrival) blocks read but not processed yet
+        self.features = featureStore(conditions)
+
+    def start_acquisition(self):
+        self.incoming.clear()
+        self.acquiring.set()
+        return
+
+    def stop_acquisition(self):
+        self.acquiring.clear()
+        return
+
+    def start_recording(self, recorder):
+        with self.lock:
+            self.recorder = recorder
+            self.recording.set()
+        return
+
+    def stop_recording(self):
+        # Returns the recorder of the finished recording (to be closed by the caller); later
+        # samples are no longer recorded
+        with self.lock:
+            self.recording.clear()
+            recorder = self.recorder
+            self.recorder = None
+        return recorder
+
+    def push_block(self, values, t_us, arrival=None):
+        # Called from the acquisition thread; deque appends and pops are thread-safe.
+        # arrival: time.monotonic() at which the block was read (now if not given)
+        self.incoming.append((values, t_us, time.monotonic() if arrival is None else arrival))
+        return
+
+    def take_blocks(self):
+        # All blocks pushed since the last call, oldest first
+        blocks = []
+        while len(self.incoming) > 0:
+            blocks.append(self.incoming.popleft())
+        return blocks
+
+    def record(self, values):
+        # Called from the acquisition path with each block of raw samples
+        if not self.recording.is_set():
+            return
+        with self.lock:
+            if self.recorder is not None:
+                self.recorder.write(values)
+        return
+
+    def add_features(self, condition, measures, timestamp, channel=0):
+        with self.lock:
+            features = self.features
+        features.append(condition, measures, timestamp, channel)
+        with self.lock:
+            self.features_updated.set()
+        return
+
+    def reset_features(self, conditions):
+        # New experiment: install an empty store for its conditions
+        with self.lock:
+            self.features = featureStore(conditions)
+            self.features_updated.clear()
+            self.features_reset.set()
+        return
+
+    def take_flag(self, flag):
+        # Test-and-clear, so an update raised while the consumer is busy is not lost
+        with self.lock:
+            was_set = flag.is_set()
+            flag.clear()
+        return was_set
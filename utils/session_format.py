@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+import numpy as np
+
+from utils.recorder import streamingRecorder
+from utils.feature_store import FEATURE_DTYPE
+
+# On-disk session format
+#
+#   <data_root>/<experiment>_session_<utc start>/
+#       raw_signal.npy      all recorded samples, one continuous float32 .npy array (n_samples[, n_channels]),
+#                           appended to while recording (see streamingRecorder); open with mmap_mode='r'
+#       raw_signal.json     sidecar of the raw file (dtype, n_samples, n_channels)
+#       index.json          {"format": 1, "experiment", "conditions", "fs", "start_utc", "n_channels",
+#                            "segments": [{"condition", "start", "stop", "start_utc", "stop_utc", "fs"}]}
+#                           start/stop are sample offsets into raw_signal.npy (stop exclusive),
+#                           *_utc are wall-clock seconds since the epoch. The segment being
+#                           recorded is listed from its start, its stop follows the samples synced
+#                           to disk, so a crash loses at most the last fsync interval of it
+#       features/<column>.npy
+#                           one plain 1-D array per column: timestamp, channel, condition (index
+#                           into "conditions"), bpm, sdnn, sdsd, ibi, rmssd, pnn50
+#
+# Nothing is pickled; every array can be memory-mapped, so reading a slice of a long session only
+# touches the pages of that slice.
+
+FORMAT_VERSION = 1
+RAW_FILE = 'raw_signal.npy'
+INDEX_FILE = 'index.json'
+FEATURES_DIR = 'features'
+
+
+def session_dir_name(experiment, start_utc):
+    return experiment + '_session_' + str(int(start_utc))
+
+
+class sessionWriter():
+    def __init__(self, root_dir, experiment, conditions, fs, start_utc) -> None:
+        self.path = os.path.join(root_dir, session_dir_name(experiment, start_utc))
+        os.makedirs(os.path.join(self.path, FEATURES_DIR), exist_ok=True)
+        self.index = {'format': FORMAT_VERSION, 'experiment': experiment, 'conditions': list(conditions),
+                      'fs': fs, 'start_utc': start_utc, 'n_channels': 1, 'segments': []}
+        self.recorder = None
+        self.n_queued = 0       # samples handed to the recorder, i.e. the offset of the next sample
+        self.segment = None     # segment being recorded, also listed in index['segments']
+        self.lock = threading.RLock()   # index updates come from the GUI, recorder and worker threads
+        self._write_index()
+
+    def start_segment(self, condition, start_utc, fs):
+        with self.lock:
+            self.segment = {'condition': condition, 'start': self.n_queued, 'stop': self.n_queued,
+                            'start_utc': start_utc, 'stop_utc': start_utc, 'fs': fs}
+            self.index['segments'].append(self.segment)
+            self._write_index()
+        return
+
+    def write(self, values):
+        # Called from the acquisition path. The raw file is created on the first block, which
+        # fixes the number of channels of the session.
+        if self.recorder is None:
+            n_channels = np.shape(values)[1] if np.ndim(values) > 1 else None
+            self.index['n_channels'] = 1 if n_channels is None else n_channels
+            self.recorder = streamingRecorder(os.path.join(self.path, RAW_FILE), n_channels=n_channels,
+                                              metadata={'fs': self.segment['fs']}, on_sync=self._synced)
+        self.recorder.write(values)
+        self.n_queued += np.shape(values)[0]
+        return
+
+    def end_segment(self, stop_utc, fs):
+        with self.lock:
+            self.segment['stop'] = self.n_queued
+            self.segment['stop_utc'] = stop_utc
+            self.segment['fs'] = fs
+            self.index['fs'] = fs
+            self.segment = None
+            self._write_index()
+        return
+
+    def _synced(self, n_samples):
+        # Recorder thread: extend the open segment to the samples now on disk
+        with self.lock:
+            seg = self.segment
+            if seg is not None and n_samples > seg['stop']:
+                seg['stop'] = n_samples
+                seg['stop_utc'] = seg['start_utc'] + (n_samples - seg['start']) / seg['fs']
+                self._write_index()
+        return
+
+    def write_features(self, store):
+        # Columnar copy of a featureStore; conditions are stored as indices into index['conditions']
+        conditions = self.index['conditions']
+        columns = {name: [] for name in FEATURE_DTYPE.names}
+        codes = []
+        for cnd in store.conditions():
+            if cnd not in conditions:
+                conditions.append(cnd)
+            rows = store.records(cnd)
+            for name in FEATURE_DTYPE.names:
+                columns[name].append(rows[name])
+            codes.append(np.full(rows.shape[0], conditions.index(cnd), dtype=np.int16))
+        columns['condition'] = codes
+        for name, parts in columns.items():
+            dtype = np.int16 if name == 'condition' else FEATURE_DTYPE[name]
+            values = np.concatenate(parts) if len(parts) > 0 else np.empty(0, dtype=dtype)
+            np.save(os.path.join(self.path, FEATURES_DIR, name + '.npy'), values)
+        self._write_index()
+        return
+
+    def close(self):
+        # A segment still open (application quit or writer dropped while recording) ends with the
+        # samples queued so far, all of which the recorder writes before closing
+        if self.segment is not None:
+            seg = self.segment
+            self.end_segment(seg['start_utc'] + (self.n_queued - seg['start']) / seg['fs'], seg['fs'])
+        if self.recorder is not None:
+            self.recorder.close()
+        return self.path
+
+    def _write_index(self):
+        with self.lock:
+            tmp = os.path.join(self.path, INDEX_FILE + '.tmp')
+            with open(tmp, 'w') as f:
+                json.dump(self.index, f, indent=2)
+            os.replace(tmp, os.path.join(self.path, INDEX_FILE))
+        return
+
+
+class sessionReader():
+    def __init__(self, path) -> None:
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        raw_path = os.path.join(path, RAW_FILE)
+        if os.path.exists(raw_path):
+            self.raw = np.load(raw_path, mmap_mode='r')
+        else:
+            self.raw = np.empty(0, dtype=np.float32)
+
+    @property
+    def conditions(self):
+        return self.index['conditions']
+
+    @property
+    def segments(self):
+        return self.index['segments']
+
+    def segment_data(self, i):
+        seg = self.segments[i]
+        return self.raw[seg['start']:seg['stop']]
+
+    def condition_data(self, condition):
+        # Views of all segments recorded under the condition
+        return [self.segment_data(i) for i, seg in enumerate(self.segments) if seg['condition'] == condition]
+
+    def time_slice(self, start_utc, stop_utc):
+        # Zero-copy views of the samples recorded between two wall-clock times, one per overlapping
+        # segment, as (segment, view) pairs
+        out = []
+        for i, seg in enumerate(self.segments):
+            if seg['stop_utc'] <= start_utc or seg['start_utc'] >= stop_utc:
+                continue
+            n = seg['stop'] - seg['start']
+            first = int(np.clip(np.floor((start_utc - seg['start_utc']) * seg['fs']), 0, n))
+            last = int(np.clip(np.ceil((stop_utc - seg['start_utc']) * seg['fs']), 0, n))
+            out.append((seg, self.raw[seg['start'] + first:seg['start'] + last]))
+        return out
+
+    def features(self, condition=None):
+        # Dict of feature columns (memory-mapped), optionally only the rows of one condition
+        folder = os.path.join(self.path, FEATURES_DIR)
+        names = list(FEATURE_DTYPE.names) + ['condition']
+        columns = {}
+        for name in names:
+            fname = os.path.join(folder, name + '.npy')
+            columns[name] = np.load(fname, mmap_mode='r') if os.path.exists(fname) else None
+        n_rows = columns['timestamp'].shape[0] if columns['timestamp'] is not None else 0
+        for name in names:
+            if columns[name] is None:
+                # Column added after the session was written (e.g. channel): single-channel default
+                columns[name] = np.zeros(n_rows, dtype=np.int16 if name == 'condition' else FEATURE_DTYPE[name])
+        if condition is None:
+            return columns
+        sel = columns['condition'] == self.conditions.index(condition)
+        return {name: values[sel] for name, values in columns.items()}
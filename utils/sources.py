@@ -0,0 +1,276 @@
+import argparse
+import os
+import select
+import threading
+import time
+import numpy as np
+
+from utils.protocol import encode_frames, CMD_BINARY, CMD_ASCII
+
+# Data sources for running the acquisition pipeline without an Arduino.
+#
+# A generator produces blocks of samples with sequence numbers and device timestamps:
+#   syntheticPPG      configurable rate, heart rate, HRV, noise, baseline wander, dropouts and channels
+#   replayRecording   streams a saved recording (.npy or session directory)
+# and is served either
+#   in-process by generatorPort, which has the readBlock() interface of devices.serialPort, or
+#   through a pseudo-terminal by ptyDevice, which behaves like the PulseSensor sketch (ASCII lines,
+#   'B'/'A' switch to binary frames and back), so the unchanged serialPort can open it by name.
+#
+#   python -m utils.sources --rate 250 --hr 70     prints the pty name to connect to
+
+
+class syntheticPPG():
+    def __init__(self, rate=100.0, hr=70.0, hrv=0.05, noise=0.01, dropout_rate=0.0, dropout_len=10,
+                 amplitude=200.0, offset=512.0, n_channels=1, seed=None) -> None:
+        self.rate = rate                    # samples per second
+        self.hr = hr                        # mean heart rate (bpm)
+        self.hrv = hrv                      # relative standard deviation of the beat intervals
+        self.noise = noise                  # white noise, relative to the amplitude
+        self.dropout_rate = dropout_rate    # dropouts per second
+        self.dropout_len = dropout_len      # samples lost per dropout
+        self.amplitude = amplitude
+        self.offset = offset
+        self.n_channels = n_channels        # independent subjects, one per channel
+        self.rng = np.random.default_rng(seed)
+        # Heart rates of the subjects spread around hr
+        self.channel_hr = hr * (1.0 + 0.1 * np.linspace(-1, 1, n_channels)) if n_channels > 1 else np.array([hr])
+        self.n_generated = 0                # sample index (= sequence number) of the next sample
+        self.beats = [np.array([0.0]) for ch in range(n_channels)]  # beat onsets covering the generated span
+        self.dropped = 0
+
+    def generate(self, n):
+        # Returns (samples, seq, t_us) for the next n sample periods, dropouts removed; samples are
+        # (n,) for one channel and (n, n_channels) otherwise
+        k = self.n_generated + np.arange(n)
+        t = k / self.rate
+        y = np.empty((n, self.n_channels))
+        for ch in range(self.n_channels):
+            y[:, ch] = self._pulse(ch, t)
+        y = self.offset + self.amplitude * (y + self.noise * self.rng.standard_normal(y.shape))
+        samples = np.clip(np.round(y), 0, 1023)
+        if self.n_channels == 1:
+            samples = samples[:, 0]
+        self.n_generated += n
+
+        keep = np.ones(n, dtype=bool)
+        if self.dropout_rate > 0:
+            starts = np.nonzero(self.rng.random(n) < self.dropout_rate / self.rate)[0]
+            for s in starts:
+                keep[s:s + self.dropout_len] = False
+            self.dropped += int(n - keep.sum())
+        return samples[keep], k[keep], (t[keep] * 1e6).astype(np.int64)
+
+    def _pulse(self, ch, t):
+        beats = self.beats[ch]
+        while beats[-1] <= t[-1] + 2.0:
+            ibi = 60.0 / self.channel_hr[ch] * (1.0 + self.hrv * self.rng.standard_normal(16))
+            beats = np.concatenate((beats, beats[-1] + np.cumsum(np.clip(ibi, 0.25, 2.5))))
+        first = max(np.searchsorted(beats, t[0], side='right') - 2, 0)
+        beats = beats[first:]     # older beats are no longer needed
+        self.beats[ch] = beats
+
+        idx = np.searchsorted(beats, t, side='right') - 1
+        phase = (t - beats[idx]) / (beats[idx + 1] - beats[idx])
+        pulse = np.exp(-((phase - 0.2) / 0.08) ** 2) + 0.4 * np.exp(-((phase - 0.55) / 0.1) ** 2)
+        return pulse + 0.1 * np.sin(2 * np.pi * 0.25 * t + ch)
+
+
+class replayRecording():
+    def __init__(self, samples, rate, loop=False) -> None:
+        self.samples = samples      # 1-D or (n, channels) array, e.g. np.load(..., mmap_mode='r')
+        self.rate = rate
+        self.loop = loop
+        self.n_generated = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_file(cls, path, rate=None, loop=False):
+        # A .npy recording (rate from its JSON sidecar if present) or a session directory
+        if os.path.isdir(path):
+            from utils.session_format import sessionReader
+            session = sessionReader(path)
+            return cls(session.raw, rate if rate is not None else session.index['fs'], loop)
+        sidecar = os.path.splitext(path)[0] + '.json'
+        if rate is None and os.path.exists(sidecar):
+            import json
+            with open(sidecar) as f:
+                rate = json.load(f).get('fs')
+        return cls(np.load(path, mmap_mode='r'), rate if rate is not None else 100.0, loop)
+
+    @property
+    def finished(self):
+        return not self.loop and self.n_generated >= self.samples.shape[0]
+
+    def generate(self, n):
+        total = self.samples.shape[0]
+        k = self.n_generated + np.arange(n)
+        if self.loop:
+            samples = np.asarray(self.samples[k % total], dtype=np.float64)
+        else:
+            k = k[k < total]
+            samples = np.asarray(self.samples[k[0]:k[-1] + 1] if k.shape[0] > 0 else self.samples[:0], dtype=np.float64)
+        self.n_generated += k.shape[0]
+        return samples, k, (k / self.rate * 1e6).astype(np.int64)
+
+
+def pace(generator, start_time, speed):
+    # Samples due since start_time at `speed` times real time
+    due = int((time.monotonic() - start_time) * generator.rate * speed)
+    return max(due - generator.n_generated, 0)
+
+
+# In-process source with the readBlock() interface of serialPort. speed=1.0 streams in real time,
+# speed=None returns blocks of max_block samples as fast as they are requested.
+class generatorPort():
+    def __init__(self, generator, speed=1.0, max_block=1000, block_time=0.01) -> None:
+        self.generator = generator
+        self.speed = speed
+        self.max_block = max_block
+        self.block_time = block_time
+        self.ports = []
+        self.protocol = 'binary'
+        self.start_time = None
+
+    def connectPort(self, port_name=None):
+        self.start_time = time.monotonic()
+        return True
+
+    def disconnectPort(self):
+        return
+
+    def reconnect(self):
+        return True
+
+    def cancelRead(self):
+        return
+
+    def readBlock(self):
+        if self.start_time is None:
+            self.connectPort()
+        if self.speed is None:
+            n = self.max_block
+        else:
+            time.sleep(self.block_time)
+            n = min(pace(self.generator, self.start_time, self.speed), self.max_block)
+        samples, seq, t_us = self.generator.generate(n) if n > 0 else (np.empty(0), None, np.empty(0, dtype=np.int64))
+        return samples, t_us
+
+
+# Pseudo-terminal that behaves like the Arduino: the slave end (port_name) can be opened by
+# serialPort / pyserial. A background thread writes the generated samples to the master end as
+# ASCII lines or, after 'B' was received, as binary frames.
+class ptyDevice():
+    def __init__(self, generator, speed=1.0, block_time=0.01, binary=False) -> None:
+        import tty
+        self.generator = generator
+        self.speed = speed
+        self.block_time = block_time
+        self.binary = binary
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port_name = os.ttyname(self.slave)
+        os.set_blocking(self.master, False)
+        self.written_bytes = 0
+        self.overruns = 0
+        self.start_time = None      # time.monotonic() of sample 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(name='ptyDevice', target=self._run, daemon=True)
+
+    def start(self):
+        self.start_time = time.monotonic()
+        self.thread.start()
+        return self.port_name
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+        return
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self._read_commands()
+            if self.speed is None:
+                n = int(self.generator.rate * self.block_time)
+            else:
+                time.sleep(self.block_time)
+                n = pace(self.generator, self.start_time, self.speed)
+            if getattr(self.generator, 'finished', False):
+                break
+            if n == 0:
+                continue
+            samples, seq, t_us = self.generator.generate(n)
+            if samples.shape[0] == 0:
+                continue
+            if self.binary:
+                data = encode_frames(seq, t_us, samples.astype(np.uint16))
+            elif samples.ndim == 1:
+                data = b''.join(b'%d\r\n' % v for v in samples.astype(np.int64).tolist())
+            else:
+                # Several channels: comma-separated values per line
+                data = b''.join(b','.join(b'%d' % v for v in row) + b'\r\n' for row in samples.astype(np.int64).tolist())
+            self._write(data)
+        return
+
+    def _read_commands(self):
+        while select.select([self.master], [], [], 0)[0]:
+            try:
+                cmd = os.read(self.master, 64)
+            except (BlockingIOError, OSError):
+                return
+            if CMD_BINARY in cmd:
+                self.binary = True
+            elif CMD_ASCII in cmd:
+                self.binary = False
+        return
+
+    def _write(self, data):
+        while len(data) > 0:
+            try:
+                written = os.write(self.master, data)
+            except BlockingIOError:
+                if self.speed is not None:
+                    self.overruns += 1      # in real time, data nobody reads is dropped like on a UART
+                    return
+                # As fast as possible: wait for the reader to catch up
+                select.select([], [self.master], [], 0.1)
+                if self.stop_event.is_set():
+                    return
+                continue
+            self.written_bytes += written
+            data = data[written:]
+        return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve simulated or replayed PPG data on a pseudo-terminal.')
+    parser.add_argument('--rate', type=float, default=100.0, help='sampling rate (Hz)')
+    parser.add_argument('--hr', type=float, default=70.0, help='mean heart rate (bpm)')
+    parser.add_argument('--hrv', type=float, default=0.05, help='relative beat interval variability')
+    parser.add_argument('--noise', type=float, default=0.01, help='noise relative to the pulse amplitude')
+    parser.add_argument('--dropouts', type=float, default=0.0, help='dropouts per second')
+    parser.add_argument('--channels', type=int, default=1, help='simulated subjects (analog channels) on the board')
+    parser.add_argument('--replay', default=None, help='recording (.npy or session directory) to replay instead')
+    parser.add_argument('--speed', type=float, default=1.0, help='multiple of real time, 0 for as fast as possible')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.replay is not None:
+        generator = replayRecording.from_file(args.replay, loop=True)
+    else:
+        generator = syntheticPPG(rate=args.rate, hr=args.hr, hrv=args.hrv, noise=args.noise,
+                                 dropout_rate=args.dropouts, n_channels=args.channels, seed=args.seed)
+    device = ptyDevice(generator, speed=args.speed if args.speed > 0 else None)
+    print('Simulated PPG device on ' + device.start() + ' (Ctrl+C to stop)')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        device.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,262 @@
+import argparse
+import collections
+import selectors
+import socket
+import struct
+import threading
+import numpy as np
+
+from utils.hrv_lib import HRV_MEASURES
+
+# Live samples and features for other programs (stimulus presentation, analysis) over a local
+# TCP socket. Every subscriber gets the same stream of frames, all little-endian:
+#
+#   header (16 bytes)
+#   offset  size  field
+#   0       2     magic b'PS'
+#   2       1     frame type: 1 samples, 2 features
+#   3       1     n_channels (samples frames, else 0)
+#   4       4     payload length in bytes (uint32)
+#   8       8     timestamp: Unix time in seconds (float64) of the first sample / of the features
+#
+#   samples payload:   sample period in seconds (float64), then n_samples x n_channels filtered
+#                      samples (float32, row-major)
+#   features payload:  channel (int16), condition length (uint16), condition (UTF-8), then one
+#                      float64 per HRV_MEASURES entry (NaN if missing)
+#
+# publish_*() only encode the frame and queue it; a server thread accepts subscribers and writes
+# to non-blocking sockets, so the acquisition path never waits on the network. A subscriber whose
+# unsent data exceeds max_buffer is disconnected instead of holding up the others.
+#
+#   python -m utils.streaming --port 5555      prints what a subscriber receives
+
+MAGIC = b'PS'
+FRAME_SAMPLES = 1
+FRAME_FEATURES = 2
+HEADER = struct.Struct('<2sBBId')
+SAMPLES_HEAD = struct.Struct('<d')
+FEATURES_HEAD = struct.Struct('<hH')
+
+
+def encode_samples(t0, period, samples):
+    samples = np.asarray(samples, dtype='<f4')
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    payload = SAMPLES_HEAD.pack(period) + samples.tobytes()
+    return HEADER.pack(MAGIC, FRAME_SAMPLES, samples.shape[1], len(payload), t0) + payload
+
+
+def encode_features(timestamp, condition, measures, channel=0):
+    # measures: dict with HRV_MEASURES keys
+    name = condition.encode('utf-8')
+    values = np.array([measures.get(m, np.nan) for m in HRV_MEASURES], dtype='<f8')
+    payload = FEATURES_HEAD.pack(channel, len(name)) + name + values.tobytes()
+    return HEADER.pack(MAGIC, FRAME_FEATURES, 0, len(payload), timestamp) + payload
+
+
+class streamServer():
+    def __init__(self, port=5555, host='127.0.0.1', max_buffer=1 << 20) -> None:
+        self.max_buffer = max_buffer    # bytes queued for one subscriber before it is dropped
+        self.listener = socket.create_server((host, port))
+        self.listener.setblocking(False)
+        self.address = self.listener.getsockname()
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_r.setblocking(False)
+        self.wake_w.setblocking(False)
+        self.outbox = collections.deque()   # encoded frames not yet handed to the subscribers
+        self.clients = {}                   # socket -> bytearray of unsent data
+        self.selector = selectors.DefaultSelector()
+        self.closing = False
+        self.thread = None
+        self.frames = 0
+        self.dropped_clients = 0
+
+    @property
+    def n_clients(self):
+        return len(self.clients)
+
+    def start(self):
+        self.selector.register(self.listener, selectors.EVENT_READ, 'listen')
+        self.selector.register(self.wake_r, selectors.EVENT_READ, 'wake')
+        self.thread = threading.Thread(name='streamServer', target=self._run, daemon=True)
+        self.thread.start()
+        return self.address
+
+    def stop(self):
+        self.closing = True
+        self._wake()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        for sock in list(self.clients):
+            self._drop(sock, dropped=False)
+        self.selector.close()
+        self.listener.close()
+        self.wake_r.close()
+        self.wake_w.close()
+        return
+
+    def publish_samples(self, t0, period, samples):
+        # t0: Unix time of the first sample; samples: (n,) or (n, n_channels)
+        self._queue(encode_samples(t0, period, samples))
+        return
+
+    def publish_features(self, timestamp, condition, measures, channel=0):
+        self._queue(encode_features(timestamp, condition, measures, channel))
+        return
+
+    def _queue(self, frame):
+        self.outbox.append(frame)
+        self._wake()
+        return
+
+    def _wake(self):
+        try:
+            self.wake_w.send(b'\0')
+        except BlockingIOError:
+            pass    # the server has a wake-up pending anyway
+        return
+
+    def _run(self):
+        while not self.closing:
+            for key, mask in self.selector.select():
+                if key.data == 'listen':
+                    self._accept()
+                elif key.data == 'wake':
+                    try:
+                        while self.wake_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                elif key.fileobj in self.clients:
+                    if mask & selectors.EVENT_READ:
+                        self._read(key.fileobj)
+                    if mask & selectors.EVENT_WRITE and key.fileobj in self.clients:
+                        self._flush(key.fileobj)
+            self._distribute()
+        return
+
+    def _accept(self):
+        try:
+            sock, address = self.listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.clients[sock] = bytearray()
+        self.selector.register(sock, selectors.EVENT_READ, 'client')
+        return
+
+    def _read(self, sock):
+        # Subscribers do not send anything; data is discarded, end of stream means they left
+        try:
+            data = sock.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if data == b'':
+            self._drop(sock, dropped=False)
+        return
+
+    def _distribute(self):
+        while len(self.outbox) > 0:
+            frame = self.outbox.popleft()
+            self.frames += 1
+            for sock in list(self.clients):
+                buffer = self.clients[sock]
+                if len(buffer) + len(frame) > self.max_buffer:
+                    self._drop(sock)
+                    continue
+                buffer += frame
+        for sock in list(self.clients):
+            if len(self.clients[sock]) > 0:
+                self._flush(sock)
+        return
+
+    def _flush(self, sock):
+        buffer = self.clients[sock]
+        try:
+            sent = sock.send(buffer)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            self._drop(sock, dropped=False)
+            return
+        del buffer[:sent]
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if len(buffer) > 0 else 0)
+        self.selector.modify(sock, events, 'client')
+        return
+
+    def _drop(self, sock, dropped=True):
+        if dropped:
+            self.dropped_clients += 1
+        del self.clients[sock]
+        try:
+            self.selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        sock.close()
+        return
+
+
+# Subscriber side: feed() takes received bytes and returns the complete frames as tuples
+#   ('samples', t0, period, samples (n_samples, n_channels))
+#   ('features', timestamp, channel, condition, {measure: value})
+class streamDecoder():
+    def __init__(self) -> None:
+        self.pending = b''
+
+    def feed(self, data):
+        data = self.pending + data
+        messages = []
+        pos = 0
+        while len(data) - pos >= HEADER.size:
+            magic, kind, n_channels, length, timestamp = HEADER.unpack_from(data, pos)
+            if magic != MAGIC:
+                raise ValueError('not a PhysComp stream')
+            if len(data) - pos - HEADER.size < length:
+                break
+            payload = data[pos + HEADER.size:pos + HEADER.size + length]
+            pos += HEADER.size + length
+            if kind == FRAME_SAMPLES:
+                period, = SAMPLES_HEAD.unpack_from(payload)
+                samples = np.frombuffer(payload, dtype='<f4', offset=SAMPLES_HEAD.size).reshape(-1, n_channels)
+                messages.append(('samples', timestamp, period, samples))
+            elif kind == FRAME_FEATURES:
+                channel, name_len = FEATURES_HEAD.unpack_from(payload)
+                start = FEATURES_HEAD.size
+                condition = payload[start:start + name_len].decode('utf-8')
+                values = np.frombuffer(payload, dtype='<f8', offset=start + name_len)
+                messages.append(('features', timestamp, channel, condition, dict(zip(HRV_MEASURES, values.tolist()))))
+        self.pending = data[pos:]
+        return messages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Print the live stream of a running PhysComp instance.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    args = parser.parse_args(argv)
+    decoder = streamDecoder()
+    with socket.create_connection((args.host, args.port)) as sock:
+        try:
+            while True:
+                data = sock.recv(65536)
+                if data == b'':
+                    break
+                for message in decoder.feed(data):
+                    if message[0] == 'samples':
+                        kind, t0, period, samples = message
+                        print('%.3f  %d samples x %d channels at %.1f Hz' % (t0, samples.shape[0], samples.shape[1], 1.0 / period))
+                    else:
+                        kind, timestamp, channel, condition, measures = message
+                        print('%.3f  features of %s, channel %d: ' % (timestamp, condition, channel) +
+                              ', '.join('%s %.1f' % (k, v) for k, v in measures.items()))
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,166 @@
+import collections
+import time
+import numpy as np
+
+
+# Estimates the real sampling rate of the incoming stream. Device timestamps (binary protocol) are
+# used when available; otherwise the host arrival time of each block is used, which is noisier per
+# block but averages out over the estimation window.
+class sampleRateEstimator():
+    def __init__(self, window=10.0, min_span=3.0) -> None:
+        self.window = window        # seconds of history used for the estimate
+        self.min_span = min_span    # seconds of history needed before the estimate is trusted
+        self.history = collections.deque()  # (time of the block's last sample, samples received so far)
+        self.n_samples = 0
+        self.device_clock = None
+        self.fs = None
+
+    def update(self, n_new, t_us=None, host_time=None):
+        if n_new == 0:
+            return self.fs
+        use_device_clock = t_us is not None
+        if self.device_clock is not None and use_device_clock != self.device_clock:
+            # Switched between host and device clocks (protocol renegotiated)
+            self.history.clear()
+        self.device_clock = use_device_clock
+        t = t_us[-1] * 1e-6 if use_device_clock else host_time
+
+        self.n_samples += n_new
+        if len(self.history) > 0 and t < self.history[-1][0]:
+            self.history.clear()    # device reset
+        self.history.append((t, self.n_samples))
+        while len(self.history) > 2 and (t - self.history[1][0]) >= self.window:
+            self.history.popleft()
+
+        t0, n0 = self.history[0]
+        if t > t0:
+            self.fs = (self.n_samples - n0) / (t - t0)
+        return self.fs
+
+    @property
+    def settled(self):
+        return self.fs is not None and (self.history[-1][0] - self.history[0][0]) >= self.min_span
+
+    def reset(self):
+        self.history.clear()
+        self.n_samples = 0
+        self.device_clock = None
+        self.fs = None
+        return
+
+
+# Linear interpolation of an irregularly timed stream onto a uniform grid at fs. The last input
+# sample and the grid position are carried across blocks so the output is continuous.
+class streamResampler():
+    def __init__(self, fs, grid_start=None) -> None:
+        self.fs = fs
+        self.grid_start = grid_start    # fixed time of the first output sample (default: first input sample)
+        self.last_t = None
+        self.last_x = None
+        self.t_start = None     # time of the first output sample
+        self.n_out = 0          # output samples produced since t_start
+
+    def process(self, x, t):
+        # x: (n_samples[, n_channels]), t: sample times in seconds
+        x = np.asarray(x, dtype=np.float64)
+        t = np.asarray(t, dtype=np.float64)
+        if x.shape[0] == 0:
+            return x
+        if self.last_t is not None and t[0] > self.last_t:
+            t = np.concatenate(([self.last_t], t))
+            x = np.concatenate((self.last_x[np.newaxis], x))
+        else:
+            # First block, or the clock went backwards: restart the grid
+            if self.grid_start is None:
+                self.t_start = t[0]
+                self.n_out = 0
+            elif self.t_start is None:
+                self.t_start = self.grid_start
+        self.last_t = t[-1]
+        self.last_x = x[-1]
+
+        next_t = self.t_start + self.n_out / self.fs
+        if t[-1] < next_t:
+            return np.empty((0,) + x.shape[1:])
+        n = int(np.floor((t[-1] - next_t) * self.fs)) + 1
+        grid = self.t_start + (self.n_out + np.arange(n)) / self.fs
+        self.n_out += n
+        if x.ndim == 1:
+            return np.interp(grid, t, x)
+        return np.stack([np.interp(grid, t, x[:, ch]) for ch in range(x.shape[1])], axis=1)
+
+    def reset(self):
+        self.last_t = None
+        self.last_x = None
+        self.t_start = None
+        self.n_out = 0
+        return
+
+
+# Paces redraws at a fixed display rate, independent of the sampling rate. The owner calls
+# should_render() on every timer tick and rendered() after drawing. Rendering may take at most
+# max_load of the wall time: after a frame that took d seconds, the next one is not drawn before
+# d * (1 / max_load - 1) has passed, so slow frames lower the frame rate instead of piling up
+# events. Ticks without a render, and ticks the timer missed, are counted as dropped frames.
+class frameScheduler():
+    def __init__(self, fps=30.0, max_load=0.5) -> None:
+        self.fps = fps
+        self.interval = 1.0 / fps
+        self.max_load = max_load
+        self.reset()
+
+    def reset(self):
+        self.last_tick = None
+        self.next_render = 0.0
+        self.render_time = None     # smoothed seconds per rendered frame
+        self.frames = 0
+        self.dropped = 0
+        self.frame_times = collections.deque(maxlen=int(round(2 * self.fps)))
+        return
+
+    def should_render(self, now):
+        if self.last_tick is not None:
+            missed = int((now - self.last_tick) / self.interval + 0.5) - 1
+            if missed > 0:
+                self.dropped += missed
+        self.last_tick = now
+        if now < self.next_render:
+            self.dropped += 1
+            return False
+        return True
+
+    def rendered(self, start, end):
+        duration = end - start
+        self.render_time = duration if self.render_time is None else 0.8 * self.render_time + 0.2 * duration
+        self.next_render = end + self.render_time * (1.0 / self.max_load - 1.0)
+        self.frames += 1
+        self.frame_times.append(end)
+        return
+
+    @property
+    def measured_fps(self):
+        if len(self.frame_times) < 2 or self.frame_times[-1] == self.frame_times[0]:
+            return 0.0
+        return (len(self.frame_times) - 1) / (self.frame_times[-1] - self.frame_times[0])
+
+
+# Wall-clock milestones of application startup (main.py --profile-startup): mark() records the
+# time since t0, report() lists every step with its own duration and the time since t0.
+class startupProfile():
+    def __init__(self, t0=None, enabled=True) -> None:
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.enabled = enabled
+        self.marks = []     # (label, seconds since t0)
+
+    def mark(self, label):
+        if self.enabled:
+            self.marks.append((label, time.perf_counter() - self.t0))
+        return
+
+    def report(self):
+        lines = ['Startup time (ms)      step     total']
+        previous = 0.0
+        for label, t in self.marks:
+            lines.append('  %-18s %8.1f %9.1f' % (label, (t - previous) * 1e3, t * 1e3))
+            previous = t
+        return '\n'.join(lines)
@@ -0,0 +1,97 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Policies for keyed tasks, applied when a task with the same key is still queued or running:
+#   'skip'      drop the new request (periodic work whose next tick will come anyway)
+#   'coalesce'  remember only the latest request and run it once the current one finishes
+SKIP = 'skip'
+COALESCE = 'coalesce'
+
+logger = logging.getLogger(__name__)
+
+
+# Shared, bounded executor for background work. A fixed number of threads serves all tasks;
+# at most max_pending unkeyed tasks are outstanding at once, further submissions block until one
+# completes (backpressure instead of unbounded queues). CPU-heavy DSP can be sent to an optional
+# process pool, created on first use.
+class workerPool():
+    def __init__(self, max_workers=2, max_pending=8, max_processes=None) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='worker')
+        self.max_processes = max_processes
+        self.process_executor = None
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.active = {}        # key -> Future of the queued / running task
+        self.coalesced = {}     # key -> (fn, args, kwargs, use_process) waiting for the active task to finish
+        self.skipped = 0
+        self.merged = 0
+        self.closed = False
+
+    def submit(self, fn, *args, key=None, policy=SKIP, use_process=False, **kwargs):
+        # Returns the Future of the scheduled task, or None if it was skipped / merged
+        if key is None:
+            self.slots.acquire()
+            try:
+                future = self._executor(use_process).submit(fn, *args, **kwargs)
+            except BaseException:
+                self.slots.release()     # e.g. submitted after shutdown()
+                raise
+            future.add_done_callback(self._report)
+            future.add_done_callback(lambda f: self.slots.release())
+            return future
+
+        with self.lock:
+            if key in self.active:
+                if policy == COALESCE:
+                    if key in self.coalesced:
+                        self.merged += 1
+                    self.coalesced[key] = (fn, args, kwargs, use_process)
+                else:
+                    self.skipped += 1
+                return None
+            future = self._executor(use_process).submit(fn, *args, **kwargs)
+            self.active[key] = future
+        future.add_done_callback(self._report)
+        future.add_done_callback(lambda f: self._finished(key))
+        return future
+
+    def _finished(self, key):
+        with self.lock:
+            del self.active[key]
+            pending = self.coalesced.pop(key, None)
+            if pending is None or self.closed:
+                return
+            fn, args, kwargs, use_process = pending
+            future = self._executor(use_process).submit(fn, *args, **kwargs)
+            self.active[key] = future
+        future.add_done_callback(self._report)
+        future.add_done_callback(lambda f: self._finished(key))
+        return
+
+    def _report(self, future):
+        # Exceptions would otherwise stay hidden inside the Future; logged with their traceback
+        # (printed to stderr if the application does not configure logging)
+        if not future.cancelled() and future.exception() is not None:
+            logger.error('Background task failed', exc_info=future.exception())
+        return
+
+    def busy(self, key):
+        with self.lock:
+            return key in self.active
+
+    def _executor(self, use_process):
+        if not use_process:
+            return self.executor
+        if self.process_executor is None:
+            self.process_executor = ProcessPoolExecutor(max_workers=self.max_processes)
+        return self.process_executor
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            self.closed = True
+            self.coalesced.clear()
+        self.executor.shutdown(wait=wait)
+        if self.process_executor is not None:
+            self.process_executor.shutdown(wait=wait)
+        return